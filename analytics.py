@@ -0,0 +1,243 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = 'calculator_history.db'
+BUSY_TIMEOUT = 5.0
+
+# Aggregates live next to the history table and are kept up to date by
+# triggers, so every writer (GUI, web service, batch paste, migrations) feeds
+# them. Errors never reach the history table and are counted on the write
+# path with record_errors().
+TOP_EXPRESSIONS = 10
+DASHBOARD_HOURS = 24
+DASHBOARD_DAYS = 30
+
+# Pruning limits applied by prune(); the per-type totals are never pruned
+MAX_EXPRESSIONS = 1000
+HOURLY_RETENTION_DAYS = 31
+
+STAT_TABLES = ('stats_type', 'stats_hourly', 'stats_daily', 'stats_expression')
+
+
+def connect(db_path=DB_PATH):
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+
+
+def _bucket_statements(column, amount, timestamp, calc_type):
+    # Upserts written as INSERT OR IGNORE + UPDATE so they also work on
+    # SQLite builds older than 3.24. The arguments are SQL expressions:
+    # NEW.* columns inside the triggers, named parameters in record_errors
+    day = f"date({timestamp}, 'unixepoch', 'localtime')"
+    hour = f'({timestamp}) - ({timestamp}) % 3600'
+    return [
+        f'INSERT OR IGNORE INTO stats_type (type) VALUES ({calc_type})',
+        f'UPDATE stats_type SET {column} = {column} + {amount} WHERE type = {calc_type}',
+        f'INSERT OR IGNORE INTO stats_hourly (hour, type) VALUES ({hour}, {calc_type})',
+        f'''UPDATE stats_hourly SET {column} = {column} + {amount}
+           WHERE hour = {hour} AND type = {calc_type}''',
+        f'INSERT OR IGNORE INTO stats_daily (day, type) VALUES ({day}, {calc_type})',
+        f'''UPDATE stats_daily SET {column} = {column} + {amount}
+           WHERE day = {day} AND type = {calc_type}''',
+    ]
+
+
+def _history_statements(amount):
+    calc_type = "COALESCE(NEW.type, '')"
+    expression = "COALESCE(NEW.expression, '')"
+    statements = _bucket_statements('calculations', amount, 'NEW.timestamp', calc_type) + [
+        f'''INSERT OR IGNORE INTO stats_expression (expression, type)
+           VALUES ({expression}, {calc_type})''',
+        f'''UPDATE stats_expression
+           SET calculations = calculations + {amount}, last_used = NEW.timestamp
+           WHERE expression = {expression} AND type = {calc_type}''',
+    ]
+    return ''.join(statement + ';\n' for statement in statements)
+
+
+def create_schema(cursor):
+    # Creates the aggregate tables, fills them from the rows already in
+    # history and installs the triggers that maintain them from then on
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_type (
+            type TEXT PRIMARY KEY,
+            calculations INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_hourly (
+            hour INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            calculations INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, type)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            type TEXT NOT NULL,
+            calculations INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, type)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_expression (
+            expression TEXT NOT NULL,
+            type TEXT NOT NULL,
+            calculations INTEGER NOT NULL DEFAULT 0,
+            last_used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (expression, type)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stats_expression_calculations
+        ON stats_expression (calculations)
+    ''')
+    backfill(cursor)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS stats_history_insert AFTER INSERT ON history
+        BEGIN
+            {_history_statements('NEW.count')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS stats_history_repeat AFTER UPDATE OF count ON history
+        WHEN NEW.count > OLD.count
+        BEGIN
+            {_history_statements('NEW.count - OLD.count')}
+        END
+    ''')
+
+
+def backfill(cursor):
+    # Deduplicated rows only keep their latest timestamp, so repeats are
+    # attributed to the hour and day of the last use
+    for table in STAT_TABLES:
+        cursor.execute(f'DELETE FROM {table}')
+    cursor.execute('''
+        INSERT INTO stats_type (type, calculations)
+        SELECT COALESCE(type, ''), SUM(count) FROM history GROUP BY 1
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_hourly (hour, type, calculations)
+        SELECT timestamp - timestamp % 3600, COALESCE(type, ''), SUM(count)
+        FROM history GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_daily (day, type, calculations)
+        SELECT date(timestamp, 'unixepoch', 'localtime'), COALESCE(type, ''), SUM(count)
+        FROM history GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO stats_expression (expression, type, calculations, last_used)
+        SELECT COALESCE(expression, ''), COALESCE(type, ''), SUM(count), MAX(timestamp)
+        FROM history GROUP BY 1, 2
+    ''')
+
+
+def record_errors(calc_type, count=1, db_path=DB_PATH):
+    if count <= 0:
+        return
+    params = {'type': calc_type, 'count': int(count), 'now': int(time.time())}
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    for statement in _bucket_statements('errors', ':count', ':now', ':type'):
+        cursor.execute(statement, params)
+    conn.commit()
+    conn.close()
+
+
+def prune(max_expressions=MAX_EXPRESSIONS, hourly_retention_days=HOURLY_RETENTION_DAYS,
+          db_path=DB_PATH):
+    # Keeps the expression table to the most used entries and drops hourly
+    # buckets older than the dashboards show; totals and daily rows stay
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    if max_expressions is not None:
+        cursor.execute('''
+            DELETE FROM stats_expression WHERE rowid NOT IN (
+                SELECT rowid FROM stats_expression
+                ORDER BY calculations DESC, last_used DESC LIMIT ?
+            )
+        ''', (max_expressions,))
+    if hourly_retention_days is not None:
+        cutoff = int(time.time()) - int(hourly_retention_days * 86400)
+        cursor.execute('DELETE FROM stats_hourly WHERE hour < ?', (cutoff,))
+    conn.commit()
+    conn.close()
+
+
+def dashboard(db_path=DB_PATH, top=TOP_EXPRESSIONS, hours=DASHBOARD_HOURS, days=DASHBOARD_DAYS):
+    # Everything is read from the aggregate tables, so the cost does not
+    # depend on how many calculations have been logged
+    now = int(time.time())
+    first_hour = now - now % 3600 - (hours - 1) * 3600
+    first_day = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    types = cursor.execute('''
+        SELECT type, calculations, errors FROM stats_type ORDER BY calculations DESC, type
+    ''').fetchall()
+    hourly = cursor.execute('''
+        SELECT hour, SUM(calculations), SUM(errors) FROM stats_hourly
+        WHERE hour >= ? GROUP BY hour ORDER BY hour
+    ''', (first_hour,)).fetchall()
+    daily = cursor.execute('''
+        SELECT day, SUM(calculations), SUM(errors) FROM stats_daily
+        WHERE day >= ? GROUP BY day ORDER BY day
+    ''', (first_day,)).fetchall()
+    expressions = cursor.execute('''
+        SELECT expression, type, calculations FROM stats_expression
+        ORDER BY calculations DESC, last_used DESC LIMIT ?
+    ''', (top,)).fetchall()
+    conn.close()
+    return {
+        'types': [_type_entry(*row) for row in types],
+        'hourly': [{'hour': hour, 'calculations': c, 'errors': e} for hour, c, e in hourly],
+        'daily': [{'day': day, 'calculations': c, 'errors': e} for day, c, e in daily],
+        'top_expressions': [{'expression': expression, 'type': calc_type, 'count': count}
+                            for expression, calc_type, count in expressions],
+    }
+
+
+def _type_entry(calc_type, calculations, errors):
+    attempts = calculations + errors
+    return {
+        'type': calc_type,
+        'calculations': calculations,
+        'errors': errors,
+        'error_rate': errors / attempts if attempts else 0.0,
+    }
+
+
+def merge_dashboards(dashboards, top=TOP_EXPRESSIONS):
+    # Combines the dashboards of several history shards. The top expressions
+    # are merged from each shard's own top list, so they are approximate
+    types, hourly, daily, expressions = {}, {}, {}, {}
+    for board in dashboards:
+        for entry in board['types']:
+            totals = types.setdefault(entry['type'], [0, 0])
+            totals[0] += entry['calculations']
+            totals[1] += entry['errors']
+        for key, buckets, name in (('hour', hourly, 'hourly'), ('day', daily, 'daily')):
+            for entry in board[name]:
+                totals = buckets.setdefault(entry[key], [0, 0])
+                totals[0] += entry['calculations']
+                totals[1] += entry['errors']
+        for entry in board['top_expressions']:
+            key = (entry['expression'], entry['type'])
+            expressions[key] = expressions.get(key, 0) + entry['count']
+    ranked = sorted(expressions.items(), key=lambda item: -item[1])[:top]
+    return {
+        'types': sorted((_type_entry(t, c, e) for t, (c, e) in types.items()),
+                        key=lambda entry: (-entry['calculations'], entry['type'])),
+        'hourly': [{'hour': hour, 'calculations': c, 'errors': e}
+                   for hour, (c, e) in sorted(hourly.items())],
+        'daily': [{'day': day, 'calculations': c, 'errors': e}
+                  for day, (c, e) in sorted(daily.items())],
+        'top_expressions': [{'expression': expression, 'type': calc_type, 'count': count}
+                            for (expression, calc_type), count in ranked],
+    }
@@ -1,21 +1,168 @@
-from flask import Flask, render_template, request, jsonify
+import os
+from flask import Flask, Response, render_template, request, jsonify, make_response
+import analytics
+import history
+from result_cache import create_cache, evaluate_cached
+from streaming import ChannelRegistry, StreamError, BURST, MAX_PENDING, RATE_LIMIT
 
 app = Flask(__name__)
+# Static assets are not fingerprinted, so keep max-age short and let the
+# ETag that Flask adds to static files handle revalidation
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 60 * 60
+
+# Results only depend on the expression, so they can be cached for long
+RESULT_MAX_AGE = 24 * 60 * 60
+# RESULT_CACHE_URL=redis://... shares results between workers;
+# 'memory://' uses the in-process stand-in for that backend
+result_cache = create_cache(os.environ.get('RESULT_CACHE_URL'))
+
+def optional_int(value):
+    # Limits read from the environment; an empty value disables the limit
+    return int(value) if str(value).strip() else None
+
+# HISTORY_SHARDS > 1 spreads users over several SQLite files in HISTORY_DIR
+history_store = history.ShardedHistory(
+    shards=int(os.environ.get('HISTORY_SHARDS', '1')),
+    directory=os.environ.get('HISTORY_DIR', 'history_shards')
+)
+# Retention, analytics pruning and incremental VACUUM, off the request path.
+# HISTORY_MAX_ROWS applies to each user.
+compaction_jobs = history_store.start_compaction(
+    interval=float(os.environ.get('HISTORY_COMPACTION_INTERVAL', history.COMPACTION_INTERVAL)),
+    max_rows=optional_int(os.environ.get('HISTORY_MAX_ROWS', history.MAX_ROWS)),
+    max_age_days=optional_int(os.environ.get('HISTORY_MAX_AGE_DAYS', history.MAX_AGE_DAYS))
+)
+
+# Streaming channel limits, per connection
+stream_registry = ChannelRegistry(
+    max_pending=int(os.environ.get('STREAM_MAX_PENDING', MAX_PENDING)),
+    rate=float(os.environ.get('STREAM_RATE_LIMIT', RATE_LIMIT)),
+    burst=int(os.environ.get('STREAM_BURST', BURST))
+)
+
+def history_entry(row):
+    timestamp, expression, result, calc_type, count = row
+    return {
+        'timestamp': timestamp,
+        'expression': expression,
+        'result': result,
+        'type': calc_type,
+        'count': count
+    }
+
+def evaluate(expression):
+    return evaluate_cached(result_cache, expression)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    response = make_response(render_template('index.html'))
+    # Always revalidate, but answer with 304 when the page is unchanged
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.route('/calculate', methods=['POST'])
 def calculate():
     data = request.json
     expression = data.get('expression')
-    # Perform calculation logic here
+    payload = evaluate(expression)
+    if 'error' in payload:
+        if data.get('user_id'):
+            history_store.record_errors(data['user_id'], 'simple')
+        return jsonify(payload), 400
+    if data.get('user_id'):
+        history_store.log(data['user_id'], data.get('session_id', ''), expression,
+                          str(payload['result']), 'simple')
+    return jsonify(payload)
+
+@app.route('/calculate', methods=['GET'])
+def calculate_cacheable():
+    # GET variant that browsers and intermediaries may cache
+    payload = evaluate(request.args.get('expression'))
+    if 'error' in payload:
+        return jsonify(payload), 400
+    response = jsonify(payload)
+    response.cache_control.public = True
+    response.cache_control.max_age = RESULT_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/stream', methods=['GET'])
+def open_stream():
+    # Server-Sent Events channel; the first event carries the channel id to
+    # POST expressions to, results follow out of order as they finish
+    channel = stream_registry.open()
+    return Response(stream_registry.stream(channel), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stream/<channel_id>', methods=['POST'])
+def submit_stream(channel_id):
+    channel = stream_registry.get(channel_id)
+    if channel is None:
+        return jsonify({'error': 'Unknown or closed channel'}), 404
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'items must be a list of {"id", "expression"} objects'}), 400
+    try:
+        accepted = channel.submit(items, stream_registry.executor, evaluate)
+    except StreamError as e:
+        response = jsonify({'error': str(e), 'pending': channel.pending})
+        response.status_code = e.status
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    return jsonify({'accepted': accepted}), 202
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'user_id is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    rows = history_store.load(user_id, request.args.get('session_id'), limit)
+    return jsonify({'history': [history_entry(row) for row in rows]})
+
+@app.route('/history/stats', methods=['GET'])
+def history_stats():
+    # Usage dashboard served from the aggregate tables, not the raw history
+    try:
+        top = int(request.args.get('top', analytics.TOP_EXPRESSIONS))
+    except ValueError:
+        return jsonify({'error': 'top must be an integer'}), 400
+    return jsonify(history_store.dashboard(top))
+
+@app.route('/history', methods=['POST'])
+def append_history():
+    data = request.json or {}
+    if not data.get('user_id') or 'expression' not in data or 'result' not in data:
+        return jsonify({'error': 'user_id, expression and result are required'}), 400
+    calc_type = data.get('type', 'simple')
+    if calc_type not in history.CALCULATION_TYPES:
+        return jsonify({'error': f'type must be one of {", ".join(history.CALCULATION_TYPES)}'}), 400
+    history_store.log(data['user_id'], data.get('session_id', ''), str(data['expression']),
+                      str(data['result']), calc_type)
+    return jsonify({'status': 'ok'}), 201
+
+@app.route('/history/batch', methods=['POST'])
+def append_history_batch():
+    # The web page evaluates most expressions locally and syncs them here
+    data = request.get_json(force=True, silent=True) or {}
+    entries = data.get('entries')
+    if not data.get('user_id') or not isinstance(entries, list):
+        return jsonify({'error': 'user_id and a list of entries are required'}), 400
     try:
-        result = eval(expression)  # Be cautious with eval for security reasons
-        return jsonify({'result': result})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 400
+        rows = [(str(e['expression']), str(e['result']), e.get('type', 'simple')) for e in entries]
+    except (KeyError, TypeError):
+        return jsonify({'error': 'each entry needs an expression and a result'}), 400
+    # Checked before anything is written, so a bad entry rejects the batch
+    if any(calc_type not in history.CALCULATION_TYPES for _, _, calc_type in rows):
+        return jsonify({'error': f'type must be one of {", ".join(history.CALCULATION_TYPES)}'}), 400
+    history_store.log_many(data['user_id'], data.get('session_id', ''), rows)
+    return jsonify({'status': 'ok', 'count': len(rows)}), 201
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    app.run(debug=True) 
@@ -0,0 +1,79 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Times the Calculator() constructor under the offscreen Qt platform in
+# three situations. Each run is a new process with its own settings and
+# history directory, after one earlier launch created the database:
+# - fresh:    no saved state, opens on the simple page
+# - restored: saved state from an earlier session that was on --page
+# - eager:    no saved state, then every page built, as every launch did
+#             before pages were created lazily
+
+PAGES = ['simple', 'scientific', 'converter', 'size guide', 'history', 'plot']
+
+CHILD = r'''
+import sys
+import time
+from PyQt5.QtWidgets import QApplication
+
+app = QApplication(sys.argv[:1])
+import main
+
+mode, page = sys.argv[1], int(sys.argv[2])
+start = time.perf_counter()
+window = main.Calculator()
+if mode == 'eager':
+    for index in range(len(window.pages)):
+        window.ensure_page(index)
+elapsed = time.perf_counter() - start
+if mode == 'prepare':
+    window.switch_page(page)
+    window.save_state()
+    window.settings.sync()
+print(elapsed * 1000)
+'''
+
+
+def run_child(mode, page, home):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen',
+               XDG_CONFIG_HOME=os.path.join(home, 'config'),
+               XDG_CACHE_HOME=os.path.join(home, 'cache'),
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', CHILD, mode, str(page)], cwd=home, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return float(result.stdout.split()[-1])
+
+
+def measure(mode, page, runs):
+    timings = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as home:
+            run_child('prepare', page, home)
+            if mode != 'restored':
+                shutil.rmtree(os.path.join(home, 'config'))
+            timings.append(run_child(mode, page, home))
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GUI startup benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--page', type=int, default=2,
+                        help='page of the saved session: ' + ', '.join(
+                            f'{i} {name}' for i, name in enumerate(PAGES)))
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.page, args.runs) for mode in ('fresh', 'restored', 'eager')}
+    eager = statistics.median(results['eager'])
+    print(f'Calculator() over {args.runs} runs, saved page: {PAGES[args.page]}')
+    print(f'{"":<10}{"median ms":>10}{"min ms":>10}{"vs eager":>10}')
+    for mode, timings in results.items():
+        median = statistics.median(timings)
+        print(f'{mode:<10}{median:>10.1f}{min(timings):>10.1f}{median / eager:>9.2f}x')
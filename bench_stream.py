@@ -0,0 +1,89 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import app as calculator_app
+
+# Compares messages/sec of one POST /calculate per expression against
+# pipelining batches over the /stream channel. Each run uses fresh
+# expressions so the result cache does not favour either side.
+
+def start_server():
+    server = make_server('127.0.0.1', 0, calculator_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_plain(port, count, offset):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    for i in range(offset, offset + count):
+        conn.request('POST', '/calculate', json.dumps({'expression': f'{i}*3+1'}),
+                     {'Content-Type': 'application/json'})
+        conn.getresponse().read()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return count / elapsed
+
+def bench_stream(port, count, batch_size, offset):
+    events = http.client.HTTPConnection('127.0.0.1', port)
+    events.request('GET', '/stream')
+    response = events.getresponse()
+    channel_id = None
+    while channel_id is None:
+        line = response.readline().decode()
+        if line.startswith('data: '):
+            channel_id = json.loads(line[6:])['channel']
+
+    done = threading.Event()
+    received = []
+
+    def read_results():
+        while len(received) < count:
+            line = response.readline().decode()
+            if not line:
+                break
+            if line.startswith('data: '):
+                received.extend(json.loads(line[6:]))
+        done.set()
+
+    threading.Thread(target=read_results, daemon=True).start()
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    for first in range(offset, offset + count, batch_size):
+        last = min(first + batch_size, offset + count)
+        body = json.dumps({'items': [{'id': i, 'expression': f'{i}*3+1'} for i in range(first, last)]})
+        while True:
+            conn.request('POST', f'/stream/{channel_id}', body, {'Content-Type': 'application/json'})
+            reply = conn.getresponse()
+            reply.read()
+            if reply.status != 429:
+                break
+            # Backpressure: wait for the channel to drain
+            time.sleep(0.005)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    events.close()
+    return len(received) / elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming channel benchmark')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    # Measure throughput, not the per-connection rate limit
+    calculator_app.stream_registry.rate = 1e9
+    calculator_app.stream_registry.burst = 1e9
+    server = start_server()
+    try:
+        plain = bench_plain(server.port, args.count, 0)
+        streamed = bench_stream(server.port, args.count, args.batch, args.count)
+    finally:
+        server.shutdown()
+    print(f'POST /calculate: {plain:,.0f} messages/s')
+    print(f'/stream (batches of {args.batch}): {streamed:,.0f} messages/s ({streamed / plain:.1f}x)')
@@ -0,0 +1,39 @@
+import math
+
+from evaluator import evaluate
+
+# What the '=' button of the simple and scientific pages, and a paste into
+# them, does with the display text. Kept free of Qt so fuzz_evaluators.py
+# can use it as the reference for every other evaluation path.
+
+DIVISION_BY_ZERO = 'Error: Division by zero'
+INVALID_RESULT = 'Error: Invalid result'
+INVALID_INPUT = 'Error: Invalid input'
+
+
+def _display(result, expression):
+    # Returns the display text and the expression to log, or None on errors
+    if isinstance(result, (int, float)):
+        if math.isinf(result):
+            return DIVISION_BY_ZERO, None
+        return str(result), expression
+    return INVALID_RESULT, None
+
+
+def _evaluate(expression, degrees):
+    # The evaluator grammar, so ^ is a power on both pages and nothing but
+    # calculator functions and constants can be reached
+    try:
+        return _display(evaluate(expression, degrees), expression)
+    except ZeroDivisionError:
+        return DIVISION_BY_ZERO, None
+    except Exception:
+        return INVALID_INPUT, None
+
+
+def evaluate_simple(expression):
+    return _evaluate(expression, False)
+
+
+def evaluate_scientific(expression, degrees):
+    return _evaluate(expression, degrees)
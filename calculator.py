@@ -0,0 +1,205 @@
+import argparse
+import re
+import sys
+
+from data_functions import summarize
+from evaluator import CONSTANTS, FUNCTIONS, ExpressionError, compile_expression
+from units import UnitError, evaluate_conversion
+
+# Headless entry point: python -m calculator. Only imports the evaluator and
+# unit modules, never Qt, reportlab or Flask, so it starts quickly.
+
+ASSIGNMENT = re.compile(r'^\s*([A-Za-z_]\w*)\s*=(?!=)\s*(.+)$')
+RESERVED_NAMES = set(FUNCTIONS) | set(CONSTANTS)
+CHUNK_SIZE = 256
+HELP_TEXT = '''Enter an expression (2^10, sin(pi/2), 5!, mean([1, 2, 3]), det([[1, 2], [3, 4]])),
+a conversion (60 mi/h to m/s) or an assignment (x = 3 * 4). The last result is
+available as ans.
+Commands: :vars  :deg  :rad  :help  :quit'''
+
+
+def format_result(value):
+    if isinstance(value, tuple):
+        number, unit = value
+        return f'{number:.10g} {unit}'
+    try:
+        return str(value)
+    except ValueError:
+        # Integers beyond the interpreter's limit for str(), e.g. 2000!
+        raise ExpressionError('Result has too many digits to display')
+
+
+class Session:
+    def __init__(self, degrees=False):
+        self.degrees = degrees
+        self.variables = {}
+
+    def evaluate(self, line):
+        match = ASSIGNMENT.match(line)
+        if match:
+            name, expression = match.groups()
+            # Names starting with '_' are the evaluator's own helpers, such
+            # as _power, and a variable would shadow them
+            if name in RESERVED_NAMES or name.startswith('_'):
+                raise ExpressionError(f'Cannot assign to {name}')
+            value = self.calculate(expression)
+            if not isinstance(value, (int, float)):
+                raise ExpressionError('Only numbers can be stored in variables')
+            self.variables[name] = value
+            return value
+        value = self.calculate(line)
+        if isinstance(value, (int, float)):
+            self.variables['ans'] = value
+        return value
+
+    def calculate(self, text):
+        # Expressions first, then unit conversions ("10 in to cm" is not a
+        # valid expression, so there is no ambiguity)
+        names = tuple(sorted(self.variables))
+        try:
+            compiled = compile_expression(text, names, self.degrees)
+        except ExpressionError as error:
+            try:
+                return evaluate_conversion(text)
+            except UnitError:
+                raise error
+        try:
+            return compiled(*[self.variables[name] for name in names])
+        except (ArithmeticError, ValueError, TypeError) as e:
+            raise ExpressionError(str(e) or type(e).__name__)
+
+
+def evaluate_line(line, degrees=False):
+    # One independent line in batch mode; returns (ok, output text)
+    try:
+        return True, format_result(Session(degrees).calculate(line))
+    except (ExpressionError, UnitError) as e:
+        return False, f'Error: {str(e)}'
+
+
+def _evaluate_line_job(job):
+    return evaluate_line(*job)
+
+
+def _input_lines(stream):
+    for raw in stream:
+        line = raw.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def run_batch(stream, output, degrees=False, jobs=1):
+    # Results are written as they are produced, one line per input line.
+    # Sequential runs share variables between lines; with a process pool
+    # every line is evaluated on its own.
+    failures = 0
+    if jobs > 1:
+        import multiprocessing
+        with multiprocessing.Pool(jobs) as pool:
+            lines = ((line, degrees) for line in _input_lines(stream))
+            for ok, text in pool.imap(_evaluate_line_job, lines, CHUNK_SIZE):
+                failures += not ok
+                output.write(text + '\n')
+    else:
+        session = Session(degrees)
+        for line in _input_lines(stream):
+            try:
+                output.write(format_result(session.evaluate(line)) + '\n')
+            except (ExpressionError, UnitError) as e:
+                failures += 1
+                output.write(f'Error: {str(e)}\n')
+            output.flush()
+    output.flush()
+    return failures
+
+
+def read_numbers(stream):
+    for line in stream:
+        for token in line.replace(',', ' ').split():
+            yield float(token)
+
+
+def run_stats(stream, output):
+    # One pass over the input in chunks, so files larger than memory work
+    try:
+        stats = summarize(read_numbers(stream))
+    except ValueError as e:
+        output.write(f'Error: {str(e)}\n')
+        return 1
+    if not stats.count:
+        output.write('Error: No numbers in input\n')
+        return 1
+    output.write(f'count {stats.count}\n')
+    output.write(f'mean  {stats.mean:.10g}\n')
+    if stats.count > 1:
+        output.write(f'std   {stats.variance() ** 0.5:.10g}\n')
+    output.write(f'min   {stats.minimum:.10g}\n')
+    output.write(f'max   {stats.maximum:.10g}\n')
+    return 0
+
+
+def run_repl(degrees=False):
+    try:
+        import readline  # noqa: F401 - enables arrow-key history recall
+    except ImportError:
+        pass
+    session = Session(degrees)
+    print(HELP_TEXT)
+    while True:
+        try:
+            line = input('deg> ' if session.degrees else '> ').strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return
+        if not line:
+            continue
+        if line in (':quit', ':q', 'exit', 'quit'):
+            return
+        if line == ':help':
+            print(HELP_TEXT)
+        elif line == ':vars':
+            for name, value in sorted(session.variables.items()):
+                print(f'{name} = {value}')
+        elif line in (':deg', ':rad'):
+            session.degrees = line == ':deg'
+        else:
+            try:
+                print(format_result(session.evaluate(line)))
+            except (ExpressionError, UnitError) as e:
+                print(f'Error: {str(e)}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m calculator',
+                                     description='All-in-One Calculator command line')
+    parser.add_argument('expression', nargs='*', help='evaluate this expression and exit')
+    parser.add_argument('-f', '--file', help='read expressions from a file (- for stdin)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='evaluate batch input on a pool of N processes')
+    parser.add_argument('--degrees', action='store_true', help='trigonometry in degrees')
+    parser.add_argument('--stats', metavar='FILE',
+                        help='count, mean, std, min and max of the numbers in FILE (- for stdin)')
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        if args.stats == '-':
+            return run_stats(sys.stdin, sys.stdout)
+        with open(args.stats, encoding='utf-8') as f:
+            return run_stats(f, sys.stdout)
+
+    if args.expression:
+        ok, text = evaluate_line(' '.join(args.expression), args.degrees)
+        print(text)
+        return 0 if ok else 1
+    if args.file and args.file != '-':
+        with open(args.file, encoding='utf-8') as f:
+            failures = run_batch(f, sys.stdout, args.degrees, args.jobs)
+        return 1 if failures else 0
+    if args.file == '-' or not sys.stdin.isatty():
+        return 1 if run_batch(sys.stdin, sys.stdout, args.degrees, args.jobs) else 0
+    run_repl(args.degrees)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
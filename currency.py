@@ -0,0 +1,205 @@
+import json
+import os
+import sqlite3
+import threading
+import urllib.request
+from datetime import date as date_type
+
+from data_functions import _numpy
+
+DB_PATH = 'calculator_history.db'
+BASE_CURRENCY = 'USD'
+DEFAULT_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'resources', 'currency_rates.json')
+REFRESH_INTERVAL = 6 * 60 * 60
+
+
+class CurrencyError(ValueError):
+    pass
+
+
+class RateProvider:
+    # Providers return {'YYYY-MM-DD': {currency: units per BASE_CURRENCY}}
+    def fetch(self):
+        raise NotImplementedError
+
+
+class FileRateProvider(RateProvider):
+    # Reads rates from a JSON file; stands in for a live feed in tests and offline use
+    def __init__(self, path=DEFAULT_RATES_PATH):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path, encoding='utf-8') as f:
+            return _parse_payload(json.load(f))
+
+
+class UrlRateProvider(RateProvider):
+    # Same JSON layout as FileRateProvider, served over HTTP
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            return _parse_payload(json.load(response))
+
+
+def _parse_payload(data):
+    rates = {}
+    for day, day_rates in data['rates'].items():
+        # Normalise everything onto BASE_CURRENCY
+        scale = day_rates.get(BASE_CURRENCY)
+        if scale is None:
+            raise CurrencyError(f'Rates for {day} do not include {BASE_CURRENCY}')
+        rates[day] = {code: float(rate) / scale for code, rate in day_rates.items()}
+    return rates
+
+
+class RateStore:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Snapshot of the latest rates, replaced as a whole by reload()
+        self._latest = {}
+        self._historical = {}
+        self.init_table()
+
+    def init_table(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS currency_rates (
+                date TEXT,
+                currency TEXT,
+                rate REAL,
+                PRIMARY KEY (currency, date)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def save(self, rates):
+        rows = [(day, code, rate) for day, day_rates in rates.items()
+                for code, rate in day_rates.items()]
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO currency_rates (date, currency, rate)
+            VALUES (?, ?, ?)
+        ''', rows)
+        conn.commit()
+        conn.close()
+
+    def reload(self):
+        # Builds the new snapshot first and swaps it in under the lock, so
+        # readers see the old rates or the new ones and never wait on SQLite.
+        # Called by RateUpdater, off the UI thread.
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT currency, rate FROM currency_rates AS r
+            WHERE date = (SELECT MAX(date) FROM currency_rates WHERE currency = r.currency)
+        ''')
+        latest = dict(cursor.fetchall())
+        conn.close()
+        with self._lock:
+            self._latest = latest
+            self._historical = {}
+        return latest
+
+    def latest(self):
+        # Most recent rate of every currency, empty until the first reload()
+        with self._lock:
+            return self._latest
+
+    def currencies(self):
+        return sorted(self.latest())
+
+    def rate(self, currency, on_date=None):
+        if on_date is None:
+            try:
+                return self.latest()[currency]
+            except KeyError:
+                raise CurrencyError(f'No rate for {currency}')
+        if isinstance(on_date, date_type):
+            on_date = on_date.isoformat()
+        key = (currency, on_date)
+        with self._lock:
+            if key in self._historical:
+                return self._historical[key]
+        # The primary key doubles as a (currency, date) index, so this is a
+        # single index seek for the last rate published on or before the date
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT rate FROM currency_rates
+            WHERE currency = ? AND date <= ?
+            ORDER BY date DESC LIMIT 1
+        ''', (currency, on_date))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            raise CurrencyError(f'No rate for {currency} on or before {on_date}')
+        with self._lock:
+            self._historical[key] = row[0]
+        return row[0]
+
+    def factor(self, from_currency, to_currency, on_date=None):
+        return self.rate(to_currency, on_date) / self.rate(from_currency, on_date)
+
+    def convert(self, amount, from_currency, to_currency, on_date=None):
+        return amount * self.factor(from_currency, to_currency, on_date)
+
+    def convert_many(self, amounts, from_currency, to_currency, on_date=None):
+        factor = self.factor(from_currency, to_currency, on_date)
+        np = _numpy()
+        if np is not None:
+            return (np.asarray(amounts, dtype=float) * factor).tolist()
+        return [amount * factor for amount in amounts]
+
+
+class RateUpdater(threading.Thread):
+    # Refreshes the store from a provider off the UI thread. Failures keep
+    # the previously stored rates so the converter keeps working offline.
+    def __init__(self, store, provider, interval=REFRESH_INTERVAL, on_update=None):
+        super().__init__(daemon=True)
+        self.store = store
+        self.provider = provider
+        self.interval = interval
+        self.on_update = on_update
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def refresh(self):
+        try:
+            self.store.save(self.provider.fetch())
+            self.store.reload()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            print(f"Currency rate refresh error: {str(e)}")
+            return False
+        if self.on_update:
+            self.on_update()
+        return True
+
+    def load_stored(self):
+        # Publishes the rates already in the store, before the first fetch
+        try:
+            self.store.reload()
+        except sqlite3.Error as e:
+            print(f"Currency rate load error: {str(e)}")
+            return False
+        if self.on_update:
+            self.on_update()
+        return True
+
+    def run(self):
+        self.load_stored()
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,290 @@
+import math
+from itertools import islice
+
+# Statistics and small matrix functions for the calculator grammar. Each one
+# uses NumPy when it is installed and a pure-Python kernel otherwise; both
+# return plain floats and lists.
+
+CHUNK_SIZE = 4096
+# Relative to the largest entry, so the test does not depend on the units
+SINGULAR_TOLERANCE = 1e-12
+
+_numpy_module = None
+
+
+def _numpy():
+    # Imported on first use so plain evaluation starts fast
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = False
+    return _numpy_module or None
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError('Expected a number')
+    return value
+
+
+def _vector(args):
+    # mean([1, 2, 3]) and mean(1, 2, 3) are the same
+    values = args[0] if len(args) == 1 and isinstance(args[0], list) else args
+    values = [_number(v) for v in values]
+    if not values:
+        raise ValueError('Expected at least one value')
+    return values
+
+
+def _matrix(value):
+    if not isinstance(value, list) or not value or not all(isinstance(row, list) for row in value):
+        raise TypeError('Expected a matrix such as [[1, 2], [3, 4]]')
+    width = len(value[0])
+    if not width or any(len(row) != width for row in value):
+        raise ValueError('Matrix rows must have the same, non-zero length')
+    return [[float(_number(v)) for v in row] for row in value]
+
+
+def _square(value):
+    matrix = _matrix(value)
+    if len(matrix) != len(matrix[0]):
+        raise ValueError('Expected a square matrix')
+    return matrix
+
+
+class RunningStats:
+    # One-pass count, mean, variance, min and max. Single values use
+    # Welford's update; whole chunks are reduced with NumPy and merged with
+    # Chan's pairwise formula, so memory stays bounded by the chunk size.
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def update(self, values):
+        np = _numpy()
+        if np is None:
+            for value in values:
+                self.add(float(value))
+            return
+        chunk = np.asarray(values, dtype=float)
+        if not chunk.size:
+            return
+        mean = float(chunk.mean())
+        self.merge(chunk.size, mean, float(((chunk - mean) ** 2).sum()),
+                   float(chunk.min()), float(chunk.max()))
+
+    def merge(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def variance(self, sample=True):
+        if self.count < (2 if sample else 1):
+            raise ValueError('Not enough values for a variance')
+        return self.m2 / (self.count - 1 if sample else self.count)
+
+
+def summarize(values, chunk_size=CHUNK_SIZE):
+    # Accepts any iterable, including a generator over a large file
+    stats = RunningStats()
+    iterator = iter(values)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return stats
+        stats.update(chunk)
+
+
+def mean(*args):
+    return summarize(_vector(args)).mean
+
+
+def var(*args):
+    return summarize(_vector(args)).variance()
+
+
+def std(*args):
+    return math.sqrt(var(*args))
+
+
+def pvar(*args):
+    return summarize(_vector(args)).variance(sample=False)
+
+
+def pstd(*args):
+    return math.sqrt(pvar(*args))
+
+
+def median(*args):
+    values = sorted(_vector(args))
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+def total(*args):
+    return math.fsum(_vector(args))
+
+
+def minimum(*args):
+    return min(_vector(args))
+
+
+def maximum(*args):
+    return max(_vector(args))
+
+
+def _eliminate(matrix, rhs=None):
+    # Gaussian elimination with partial pivoting on a copy of `matrix`,
+    # augmented with the right-hand side columns. Returns the upper
+    # triangular rows (None when singular) and the sign of the row swaps.
+    n = len(matrix)
+    rows = [row[:] + (rhs[i][:] if rhs else []) for i, row in enumerate(matrix)]
+    tolerance = SINGULAR_TOLERANCE * n * max(abs(v) for row in matrix for v in row)
+    sign = 1.0
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) <= tolerance:
+            return None, sign
+        if pivot != col:
+            rows[col], rows[pivot] = rows[pivot], rows[col]
+            sign = -sign
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            if factor:
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return rows, sign
+
+
+def _back_substitute(rows, n):
+    width = len(rows[0]) - n
+    solution = [[0.0] * width for _ in range(n)]
+    for i in reversed(range(n)):
+        for k in range(width):
+            acc = rows[i][n + k] - sum(rows[i][j] * solution[j][k] for j in range(i + 1, n))
+            solution[i][k] = acc / rows[i][i]
+    return solution
+
+
+def _linalg(function, *args):
+    np = _numpy()
+    try:
+        return function(*(np.asarray(a, dtype=float) for a in args)).tolist()
+    except np.linalg.LinAlgError:
+        raise ValueError('Matrix is singular')
+
+
+def det(a):
+    matrix = _square(a)
+    np = _numpy()
+    if np is not None:
+        return float(np.linalg.det(np.asarray(matrix)))
+    rows, sign = _eliminate(matrix)
+    if rows is None:
+        return 0.0
+    result = sign
+    for i in range(len(rows)):
+        result *= rows[i][i]
+    return result
+
+
+def inv(a):
+    matrix = _square(a)
+    if _numpy() is not None:
+        return _linalg(_numpy().linalg.inv, matrix)
+    n = len(matrix)
+    identity = [[float(i == j) for j in range(n)] for i in range(n)]
+    rows, _ = _eliminate(matrix, identity)
+    if rows is None:
+        raise ValueError('Matrix is singular')
+    return _back_substitute(rows, n)
+
+
+def solve(a, b):
+    # Solves a x = b for a vector b ([1, 2]) or several columns ([[1], [2]])
+    matrix = _square(a)
+    vector = isinstance(b, list) and bool(b) and not isinstance(b[0], list)
+    rhs = [[float(_number(v))] for v in b] if vector else _matrix(b)
+    if len(rhs) != len(matrix):
+        raise ValueError('Right-hand side does not match the matrix size')
+    if _numpy() is not None:
+        solution = _linalg(_numpy().linalg.solve, matrix, rhs)
+    else:
+        rows, _ = _eliminate(matrix, rhs)
+        if rows is None:
+            raise ValueError('Matrix is singular')
+        solution = _back_substitute(rows, len(matrix))
+    return [row[0] for row in solution] if vector else solution
+
+
+def transpose(a):
+    return [list(column) for column in zip(*_matrix(a))]
+
+
+def linreg(xs, ys):
+    # Least-squares line through the points; returns [slope, intercept]
+    xs, ys = _vector([xs]), _vector([ys])
+    if len(xs) != len(ys):
+        raise ValueError('linreg needs the same number of x and y values')
+    if len(xs) < 2:
+        raise ValueError('linreg needs at least two points')
+    np = _numpy()
+    if np is not None:
+        x, y = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        x_mean, y_mean = x.mean(), y.mean()
+        sxx = float(((x - x_mean) ** 2).sum())
+        sxy = float(((x - x_mean) * (y - y_mean)).sum())
+        x_mean, y_mean = float(x_mean), float(y_mean)
+    else:
+        # One pass, Welford-style co-moment
+        x_mean = y_mean = sxx = sxy = 0.0
+        for n, (x, y) in enumerate(zip(xs, ys), start=1):
+            dx = x - x_mean
+            x_mean += dx / n
+            y_mean += (y - y_mean) / n
+            sxx += dx * (x - x_mean)
+            sxy += dx * (y - y_mean)
+    if sxx == 0:
+        raise ValueError('linreg needs at least two distinct x values')
+    slope = sxy / sxx
+    return [slope, y_mean - slope * x_mean]
+
+
+DATA_FUNCTIONS = {
+    'mean': mean,
+    'median': median,
+    'var': var,
+    'std': std,
+    'pvar': pvar,
+    'pstd': pstd,
+    'sum': total,
+    'min': minimum,
+    'max': maximum,
+    'det': det,
+    'inv': inv,
+    'solve': solve,
+    'transpose': transpose,
+    'linreg': linreg,
+}
+# These return lists, which the grammar only accepts as a whole result or as
+# the argument of another data function
+LIST_FUNCTIONS = ('inv', 'solve', 'transpose', 'linreg')
@@ -0,0 +1,216 @@
+import ast
+import math
+import re
+from functools import lru_cache
+
+from data_functions import DATA_FUNCTIONS, LIST_FUNCTIONS
+
+PHI = 1.618033988749895
+
+# Exact integers keep growing, so 9**9**9**9 or 100000! would tie up a
+# worker for minutes; such results are rejected before they are computed
+MAX_INTEGER_BITS = 100_000
+MAX_FACTORIAL = 5_000
+
+
+def factorial(n):
+    if n > MAX_FACTORIAL:
+        raise ExpressionError(f'Factorial argument is too large (limit {MAX_FACTORIAL})')
+    return math.factorial(n)
+
+
+def _power(base, exponent):
+    # Every ** and ^ goes through here; floats overflow on their own
+    if (isinstance(base, int) and isinstance(exponent, int) and abs(base) > 1
+            and exponent * (abs(base) - 1).bit_length() > MAX_INTEGER_BITS):
+        raise ExpressionError('Result is too large')
+    result = base ** exponent
+    # (-8) ** (1/3) is complex in Python; the calculator only has reals
+    if isinstance(result, complex):
+        raise ExpressionError('Result is not a real number')
+    return result
+
+# Functions and constants understood by the calculator grammar
+MATH_FUNCTIONS = {
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'sinh': math.sinh,
+    'cosh': math.cosh,
+    'tanh': math.tanh,
+    'log': math.log10,
+    'ln': math.log,
+    'sqrt': math.sqrt,
+    'exp': math.exp,
+    'abs': abs,
+    'factorial': factorial,
+}
+CONSTANTS = {'pi': math.pi, 'e': math.e, 'phi': PHI}
+# Data mode: statistics over lists (mean([1, 2, 3])) and matrices (det([[1, 2], [3, 4]]))
+FUNCTIONS = {**MATH_FUNCTIONS, **DATA_FUNCTIONS}
+TRIG_FUNCTIONS = ('sin', 'cos', 'tan')
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod,
+    ast.FloorDiv, ast.USub, ast.UAdd, ast.List
+)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+_numpy_module = None
+
+
+def _numpy():
+    # Imported on first vectorized use so plain evaluation starts fast
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = False
+    return _numpy_module or None
+
+
+def _numpy_functions(np):
+    return {
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+        'sinh': np.sinh,
+        'cosh': np.cosh,
+        'tanh': np.tanh,
+        'log': np.log10,
+        'ln': np.log,
+        'sqrt': np.sqrt,
+        'exp': np.exp,
+        'abs': np.abs,
+        'factorial': np.vectorize(lambda v: math.gamma(v + 1), otypes=[float]),
+    }
+
+
+def _with_degrees(functions, radians):
+    functions = dict(functions)
+    for name in TRIG_FUNCTIONS:
+        functions[name] = (lambda f: lambda v: f(radians(v)))(functions[name])
+    return functions
+
+
+def normalize(expression):
+    # Map the button labels onto Python syntax
+    expr = expression.strip()
+    expr = expr.replace('π', 'pi').replace('×', '*').replace('÷', '/')
+    expr = expr.replace('^', '**')
+    expr = re.sub(r'([\w.]+)!', r'factorial(\1)', expr)
+    return expr
+
+
+class CompiledExpression:
+    def __init__(self, source, code, variables, degrees):
+        self.source = source
+        self.code = code
+        self.variables = variables
+        self.degrees = degrees
+        functions = MATH_FUNCTIONS
+        if degrees:
+            functions = _with_degrees(functions, math.radians)
+        self.namespace = {'__builtins__': {}, '_power': _power, **CONSTANTS, **functions,
+                          **DATA_FUNCTIONS}
+        self._vector_namespace = None
+
+    def __call__(self, *args):
+        scope = dict(zip(self.variables, args))
+        return eval(self.code, self.namespace, scope)
+
+    def evaluate_many(self, values):
+        # Evaluate a one-variable expression over many points at once.
+        # Points where the expression is undefined come back as nan.
+        np = _numpy()
+        if np is None:
+            return [self._evaluate_point(v) for v in values]
+        if self._vector_namespace is None:
+            functions = _numpy_functions(np)
+            if self.degrees:
+                functions = _with_degrees(functions, np.radians)
+            self._vector_namespace = {'__builtins__': {}, '_power': _power, **CONSTANTS,
+                                      **functions, **DATA_FUNCTIONS}
+        xs = np.asarray(values, dtype=float)
+        with np.errstate(all='ignore'):
+            try:
+                result = eval(self.code, self._vector_namespace, {self.variables[0]: xs})
+            except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+                return [self._evaluate_point(v) for v in values]
+            result = np.broadcast_to(np.asarray(result, dtype=float), xs.shape)
+        return result.tolist()
+
+    def _evaluate_point(self, value):
+        try:
+            return float(self(value))
+        except (ValueError, ZeroDivisionError, OverflowError, TypeError):
+            return float('nan')
+
+
+class _CheckedPower(ast.NodeTransformer):
+    # a ** b becomes _power(a, b), so the size limit also covers exponents
+    # that are themselves computed, as in 9**9**9
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.op, ast.Pow):
+            return node
+        call = ast.Call(func=ast.Name(id='_power', ctx=ast.Load()),
+                        args=[node.left, node.right], keywords=[])
+        return ast.copy_location(call, node)
+
+
+def _is_list(node):
+    # Lists are only data, never operands: [1, 2] * 2 would repeat the list
+    # in Python. List literals and list-valued functions may only be
+    # arguments of data functions, or the whole result.
+    if isinstance(node, ast.Call):
+        return isinstance(node.func, ast.Name) and node.func.id in LIST_FUNCTIONS
+    return isinstance(node, ast.List)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression, variables=(), degrees=False):
+    expr = normalize(expression)
+    if not expr:
+        raise ExpressionError('Empty expression')
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError:
+        raise ExpressionError(f'Invalid expression: {expression}')
+    called = {id(node.func) for node in ast.walk(tree) if isinstance(node, ast.Call)}
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionError(f'Unsupported syntax in: {expression}')
+        if isinstance(node, ast.Call):
+            if (not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS
+                    or node.keywords):
+                raise ExpressionError(f'Unsupported function call in: {expression}')
+            if node.func.id not in DATA_FUNCTIONS and any(_is_list(arg) for arg in node.args):
+                raise ExpressionError(f'{node.func.id} does not accept a list: {expression}')
+        elif isinstance(node, ast.Name):
+            if (node.id not in FUNCTIONS and node.id not in CONSTANTS
+                    and node.id not in variables):
+                raise ExpressionError(f'Unknown name: {node.id}')
+            if node.id in FUNCTIONS and id(node) not in called:
+                raise ExpressionError(f'{node.id} needs an argument: {expression}')
+        elif isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ExpressionError(f'Unsupported constant in: {expression}')
+        elif isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            operands = [node.operand] if isinstance(node, ast.UnaryOp) else [node.left, node.right]
+            if any(_is_list(operand) for operand in operands):
+                raise ExpressionError(f'Lists are only allowed inside data functions: {expression}')
+    if isinstance(tree.body, ast.List):
+        raise ExpressionError(f'Lists are only allowed inside data functions: {expression}')
+    tree = ast.fix_missing_locations(_CheckedPower().visit(tree))
+    return CompiledExpression(expression, compile(tree, '<expression>', 'eval'), variables, degrees)
+
+
+def evaluate(expression, degrees=False):
+    return compile_expression(expression, (), degrees)()
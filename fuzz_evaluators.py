@@ -0,0 +1,393 @@
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import time
+import warnings
+
+import button_evaluation
+from calculator import evaluate_line
+from evaluator import compile_expression, evaluate
+from result_cache import ResultCache, create_cache, evaluate_cached
+
+# Differential fuzzer for the evaluation paths. Random valid expressions
+# (and mutated, mostly invalid ones) are evaluated by what the '=' button
+# does today (button_evaluation.py) and by every other backend: the
+# evaluator, its vectorized path, the command line, the result cache as the
+# web service uses it and the browser evaluator in static/calculator.js
+# (when node is installed). Each backend's answers are compared with the
+# reference within a tolerance, and the time of every call is recorded, so
+# a speedup claim can be checked against the same corpus.
+
+REL_TOLERANCE = 1e-9
+ABS_TOLERANCE = 1e-12
+MAX_DEPTH = 4
+MAX_FACTORIAL = 12
+SHOW_EXAMPLES = 5
+# Integers longer than this are printed by their length only; str() refuses
+# those beyond 4300 digits
+MAX_SHOWN_DIGITS = 60
+
+SIMPLE_OPERATORS = ['+', '-', '*', '/', '//', '%']
+SCIENTIFIC_OPERATORS = ['+', '-', '*', '/', '//', '%', '^']
+SCIENTIFIC_FUNCTIONS = ['sin', 'cos', 'tan', 'sinh', 'cosh', 'tanh', 'log', 'ln', 'sqrt']
+SCIENTIFIC_CONSTANTS = ['π', 'e', 'phi']
+MUTATION_TOKENS = ['+', '-', '*', '/', '%', '^', '!', '(', ')', '.', ' ', 'sin', 'e', '0']
+
+# Mutations must not create huge powers or factorials (9^9^9, 9999!) that
+# would take minutes to evaluate; such candidates are skipped
+POWER = re.compile(r'\*\*|\^')
+SAFE_POWER = re.compile(r'(?:\*\*|\^)\s*(?:\d(?![\d.])|\(\d/\d\)|0\.5(?![\d.]))')
+LARGE_FACTORIAL = re.compile(r'\d{4,}\s*!')
+
+JS_DRIVER = r'''
+const fs = require('fs');
+const vm = require('vm');
+const noop = () => {};
+const storage = { getItem: () => 'fuzz', setItem: noop };
+const sandbox = {
+    localStorage: storage, sessionStorage: storage, setInterval: noop, console,
+    document: { addEventListener: noop }, window: { addEventListener: noop }, navigator: {},
+};
+const Calc = vm.runInNewContext(fs.readFileSync(process.argv[1], 'utf8') + '\n;Calc', sandbox);
+const results = JSON.parse(fs.readFileSync(0, 'utf8')).map(expression => {
+    const start = process.hrtime.bigint();
+    let outcome;
+    try {
+        const value = Calc.evaluateLocally(expression);
+        outcome = value === undefined ? null : ['value', value];
+    } catch (e) {
+        outcome = ['error', String(e.message)];
+    }
+    return [outcome, Number(process.hrtime.bigint() - start)];
+});
+process.stdout.write(JSON.stringify(results));
+'''
+
+
+class ExpressionGenerator:
+    def __init__(self, rng, scientific):
+        self.rng = rng
+        self.scientific = scientific
+        self.operators = SCIENTIFIC_OPERATORS if scientific else SIMPLE_OPERATORS
+
+    def number(self):
+        roll = self.rng.random()
+        if roll < 0.03:
+            # Leading zeros: 007 is a syntax error, 00 and 07.5 are not
+            return '0' + self.rng.choice(['0', str(self.rng.randint(1, 99)),
+                                          f'{self.rng.randint(0, 9)}.{self.rng.randint(0, 9)}'])
+        if roll < 0.3:
+            return f'{self.rng.randint(0, 99)}.{self.rng.randint(0, 99)}'
+        return str(self.rng.randint(0, 999))
+
+    def atom(self):
+        if self.scientific:
+            roll = self.rng.random()
+            if roll < 0.15:
+                return self.rng.choice(SCIENTIFIC_CONSTANTS)
+            if roll < 0.2:
+                return f'{self.rng.randint(0, MAX_FACTORIAL)}!'
+        return self.number()
+
+    def expression(self, depth=MAX_DEPTH):
+        roll = self.rng.random()
+        if depth == 0 or roll < 0.25:
+            return self.atom()
+        if roll < 0.35:
+            return f'({self.expression(depth - 1)})'
+        if roll < 0.42:
+            return f'-{self.atom()}'
+        if self.scientific and roll < 0.6:
+            return f'{self.rng.choice(SCIENTIFIC_FUNCTIONS)}({self.expression(depth - 1)})'
+        operator = self.rng.choice(self.operators)
+        if operator == '^':
+            # Small literal exponents only, so results stay finite and fast
+            if self.rng.random() < 0.2:
+                # A negative base with a fractional exponent has a complex
+                # result, which every backend must reject
+                exponent = self.rng.choice(['0.5', f'({self.rng.randint(1, 4)}/{self.rng.randint(2, 5)})'])
+                return f'(-{self.number()})^{exponent}'
+            return f'{self.atom()}^{self.rng.randint(0, 4)}'
+        return f'{self.expression(depth - 1)}{operator}{self.expression(depth - 1)}'
+
+    def valid(self):
+        # At most one power per expression, for the same reason
+        while True:
+            expression = self.expression()
+            if len(POWER.findall(expression)) <= 1:
+                return expression
+
+    def mutate(self, expression):
+        position = self.rng.randint(0, len(expression))
+        roll = self.rng.random()
+        if roll < 0.35 and expression:
+            position = min(position, len(expression) - 1)
+            return expression[:position] + expression[position + 1:]
+        if roll < 0.8:
+            return expression[:position] + self.rng.choice(MUTATION_TOKENS) + expression[position:]
+        if roll < 0.9:
+            return expression[:position]
+        return expression + self.rng.choice(['(', ')', '+', '*'])
+
+    def invalid(self):
+        while True:
+            expression = self.mutate(self.valid())
+            if safe(expression):
+                return expression
+
+    def respaced(self, expression):
+        # Same expression with different spacing, for the cache key check
+        # '**' and '//' are single operators, so they are never split
+        return re.sub(r'(\*\*|//|[-+*/%^()])', lambda m: self.rng.choice(['', ' ']) + m.group(1)
+                      + self.rng.choice(['', ' ']), expression)
+
+
+def safe(expression):
+    powers = POWER.findall(expression)
+    if len(powers) > 1 or len(SAFE_POWER.findall(expression)) != len(powers):
+        return False
+    return not LARGE_FACTORIAL.search(expression)
+
+
+def parse_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def value_outcome(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return ('error', f'non-real result {value!r}')
+    return ('value', value)
+
+
+def reference_backend(scientific, degrees):
+    def run(expression):
+        if scientific:
+            text, logged = button_evaluation.evaluate_scientific(expression, degrees)
+        else:
+            text, logged = button_evaluation.evaluate_simple(expression)
+        if logged is None:
+            return ('error', text)
+        return ('value', parse_number(text))
+    return run
+
+
+def evaluator_backend(degrees):
+    def run(expression):
+        try:
+            return value_outcome(evaluate(expression, degrees))
+        except Exception as e:
+            return ('error', str(e) or type(e).__name__)
+    return run
+
+
+def vectorized_backend(degrees):
+    # The plot path: the expression as a function of x, sampled at one point
+    def run(expression):
+        try:
+            value = compile_expression(expression, ('x',), degrees).evaluate_many([0.0])[0]
+        except Exception as e:
+            return ('error', str(e) or type(e).__name__)
+        return ('error', 'nan') if math.isnan(value) else ('value', value)
+    return run
+
+
+def cli_backend(degrees):
+    def run(expression):
+        ok, text = evaluate_line(expression, degrees)
+        if not ok:
+            return ('error', text)
+        try:
+            return ('value', parse_number(text))
+        except ValueError:
+            return ('error', f'not a number: {text}')
+    return run
+
+
+def cache_backends(degrees, generator):
+    # app.evaluate through the shared cache. The first worker computes and
+    # fills it; a second worker then reads the same expression with
+    # different spacing, so key normalization and the JSON round trip are
+    # exercised.
+    primary = create_cache('memory://')
+    secondary = ResultCache(backend=primary.backend)
+
+    def lookup(cache, expression):
+        payload = evaluate_cached(cache, expression, degrees)
+        if 'error' in payload:
+            return ('error', payload['error'])
+        return value_outcome(payload['result'])
+
+    def cold(expression):
+        return lookup(primary, expression)
+
+    def warm(expression):
+        return lookup(secondary, generator.respaced(expression))
+    return cold, warm
+
+
+def run_js(expressions):
+    # Returns a list of (outcome, nanoseconds); outcome is None when the
+    # browser would ask the server instead
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'calculator.js')
+    result = subprocess.run(['node', '-e', JS_DRIVER, script], input=json.dumps(expressions),
+                            capture_output=True, text=True, check=True)
+    return [(tuple(outcome) if outcome else None, ns) for outcome, ns in json.loads(result.stdout)]
+
+
+def browser_results(js, server):
+    # What the page shows: the local answer, or the server's when the
+    # browser defers to /calculate
+    return [local if local[0] is not None else (remote[0], local[1] + remote[1])
+            for local, remote in zip(js, server)]
+
+
+def run_backend(backend, expressions):
+    results = []
+    for expression in expressions:
+        start = time.perf_counter_ns()
+        outcome = backend(expression)
+        results.append((outcome, time.perf_counter_ns() - start))
+    return results
+
+
+def compare(reference, outcome):
+    # 'agree', 'mismatch', 'extension' (the backend answers where the
+    # reference reports an error) or 'deferred' (no local answer)
+    if outcome is None:
+        return 'deferred'
+    ref_kind, ref_value = reference
+    kind, value = outcome
+    finite = kind == 'value' and (isinstance(value, int) or math.isfinite(value))
+    if ref_kind == 'error':
+        return 'extension' if finite else 'agree'
+    if kind == 'error':
+        return 'mismatch'
+    if isinstance(ref_value, int) and isinstance(value, int):
+        return 'agree' if ref_value == value else 'mismatch'
+    try:
+        close = math.isclose(ref_value, value, rel_tol=REL_TOLERANCE, abs_tol=ABS_TOLERANCE)
+    except OverflowError:
+        close = False
+    return 'agree' if close or (math.isnan(ref_value) and math.isnan(value)) else 'mismatch'
+
+
+def describe(outcome):
+    if outcome and isinstance(outcome[1], int) and abs(outcome[1]) >= 10 ** MAX_SHOWN_DIGITS:
+        kind, value = outcome
+        return (kind, f'<integer of about {value.bit_length() * math.log10(2):.0f} digits>')
+    return outcome
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def report(name, verdicts, timings):
+    counts = {kind: verdicts.count(kind) for kind in ('agree', 'mismatch', 'extension', 'deferred')}
+    micros = sorted(ns / 1000 for ns in timings)
+    print(f'{name:<12} {counts["agree"]:>7} {counts["mismatch"]:>9} {counts["extension"]:>10} '
+          f'{counts["deferred"]:>9} {percentile(micros, 0.5):>9.1f} {percentile(micros, 0.9):>9.1f} '
+          f'{percentile(micros, 0.99):>9.1f} {sum(micros) / len(micros):>9.1f}')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Differential fuzzing of the evaluation backends')
+    parser.add_argument('--count', type=int, default=2000, help='expressions to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--page', choices=['simple', 'scientific'], default='scientific',
+                        help='whose buttons (and reference behaviour) to fuzz')
+    parser.add_argument('--degrees', action='store_true',
+                        help='scientific page in degree mode (the toggle unchecked)')
+    parser.add_argument('--invalid', type=float, default=0.3,
+                        help='fraction of mutated, mostly invalid expressions')
+    parser.add_argument('--strict', action='store_true',
+                        help='also fail when a backend answers where the reference errors')
+    parser.add_argument('--show', type=int, default=SHOW_EXAMPLES,
+                        help='disagreeing examples to print per backend')
+    parser.add_argument('--csv', help='write every expression, outcome and timing to this file')
+    args = parser.parse_args()
+
+    # eval() warns about things like 2(3) before failing on them
+    warnings.filterwarnings('ignore', category=SyntaxWarning)
+    scientific = args.page == 'scientific'
+    degrees = scientific and args.degrees
+    rng = random.Random(args.seed)
+    generator = ExpressionGenerator(rng, scientific)
+    corpus = [generator.invalid() if rng.random() < args.invalid else generator.valid()
+              for _ in range(args.count)]
+
+    cache_cold, cache_warm = cache_backends(degrees, generator)
+    backends = [
+        ('evaluator', evaluator_backend(degrees)),
+        ('vectorized', vectorized_backend(degrees)),
+        ('cli', cli_backend(degrees)),
+        ('cache-cold', cache_cold),
+        ('cache-warm', cache_warm),
+    ]
+    results = {'reference': run_backend(reference_backend(scientific, degrees), corpus)}
+    for name, backend in backends:
+        results[name] = run_backend(backend, corpus)
+    if shutil.which('node'):
+        # The browser evaluator has no degree mode and always works in radians
+        if not degrees:
+            results['js'] = run_js(corpus)
+            results['browser'] = browser_results(results['js'], results['cache-cold'])
+    else:
+        print('node is not installed; skipping static/calculator.js')
+
+    reference = [outcome for outcome, _ in results['reference']]
+    print(f'{len(corpus)} expressions ({args.page} page, '
+          f'{"degrees" if degrees else "radians"}, seed {args.seed})')
+    print(f'{"backend":<12} {"agree":>7} {"mismatch":>9} {"extension":>10} {"deferred":>9} '
+          f'{"p50 us":>9} {"p90 us":>9} {"p99 us":>9} {"mean us":>9}')
+    failures = 0
+    examples = {}
+    for name, rows in results.items():
+        verdicts = [compare(ref, outcome) for ref, (outcome, _) in zip(reference, rows)]
+        counts = report(name, verdicts, [ns for _, ns in rows])
+        failures += counts['mismatch'] + (counts['extension'] if args.strict else 0)
+        examples[name] = [(corpus[i], reference[i], rows[i][0]) for i, verdict in enumerate(verdicts)
+                          if verdict == 'mismatch' or (args.strict and verdict == 'extension')]
+
+    for name, rows in examples.items():
+        if rows and args.show:
+            print(f'\n{name}: {len(rows)} disagreement(s), first {min(args.show, len(rows))}:')
+            for expression, ref, outcome in rows[:args.show]:
+                print(f'  {expression!r}: reference {describe(ref)}, {name} {describe(outcome)}')
+
+    if 'js' in results:
+        # Client/server: every local answer of the browser must be what
+        # /calculate would have returned, including its errors
+        server = [outcome for outcome, _ in results['cache-cold']]
+        local = [i for i, (outcome, _) in enumerate(results['js']) if outcome is not None]
+        differences = [(corpus[i], server[i], results['js'][i][0]) for i in local
+                       if compare(server[i], results['js'][i][0]) != 'agree']
+        failures += len(differences)
+        print(f'\njs vs server: {len(local)} local answer(s), {len(differences)} difference(s)')
+        for expression, remote, outcome in differences[:args.show]:
+            print(f'  {expression!r}: server {describe(remote)}, js {describe(outcome)}')
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['backend', 'index', 'expression', 'outcome', 'value', 'verdict', 'ns'])
+            for name, rows in results.items():
+                for i, (outcome, ns) in enumerate(rows):
+                    kind, value = describe(outcome) if outcome else ('deferred', '')
+                    writer.writerow([name, i, corpus[i], kind, value,
+                                     compare(reference[i], outcome), ns])
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,291 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import analytics
+
+DB_PATH = 'calculator_history.db'
+SCHEMA_VERSION = 4
+BUSY_TIMEOUT = 5.0
+
+# Retention defaults; either limit can be disabled with None. MAX_ROWS is
+# per user id.
+MAX_ROWS = 10000
+MAX_AGE_DAYS = 365
+COMPACTION_INTERVAL = 10 * 60
+# Values of the type column, one per page or mode that logs calculations
+CALCULATION_TYPES = ('simple', 'scientific', 'data', 'conversion')
+VACUUM_PAGES = 200
+LEGACY_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def connect(db_path=DB_PATH):
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+
+
+def create_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp INTEGER NOT NULL,
+            expression TEXT,
+            result TEXT,
+            type TEXT,
+            count INTEGER NOT NULL DEFAULT 1,
+            user_id TEXT NOT NULL DEFAULT '',
+            session_id TEXT NOT NULL DEFAULT ''
+        )
+    ''')
+    create_indexes(cursor)
+
+
+def create_indexes(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history (timestamp)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_user
+        ON history (user_id, timestamp)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_user_session
+        ON history (user_id, session_id, timestamp)
+    ''')
+
+
+def _legacy_epoch(value):
+    try:
+        return int(datetime.strptime(value, LEGACY_TIMESTAMP_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+def init_db(db_path=DB_PATH, wal=False):
+    # Creates the schema, or migrates an older database in place:
+    # version 1 had TEXT timestamps and one row per press, version 2 had no
+    # user or session columns, version 3 had no analytics aggregates
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    if wal:
+        # Readers no longer block the writer, which matters for the web service
+        cursor.execute('PRAGMA journal_mode = WAL')
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        conn.close()
+        return
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history'").fetchone()
+    # auto_vacuum only takes effect on a fresh file or after a full VACUUM
+    rebuild = exists and version < 2
+    if not exists or rebuild:
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    if not exists:
+        create_schema(cursor)
+    elif version < 2:
+        migrate_v1(cursor)
+    elif version < 3:
+        migrate_v2(cursor)
+    analytics.create_schema(cursor)
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+    if rebuild:
+        cursor.execute('VACUUM')
+    conn.close()
+
+
+def migrate_v1(cursor):
+    rows = cursor.execute(
+        'SELECT timestamp, expression, result, type FROM history ORDER BY id').fetchall()
+    cursor.execute('ALTER TABLE history RENAME TO history_v1')
+    create_schema(cursor)
+    merged = []
+    for timestamp, expression, result, calc_type in rows:
+        epoch = _legacy_epoch(timestamp)
+        if merged and merged[-1][1:4] == [expression, result, calc_type]:
+            merged[-1][0] = epoch
+            merged[-1][4] += 1
+        else:
+            merged.append([epoch, expression, result, calc_type, 1])
+    cursor.executemany('''
+        INSERT INTO history (timestamp, expression, result, type, count)
+        VALUES (?, ?, ?, ?, ?)
+    ''', merged)
+    cursor.execute('DROP TABLE history_v1')
+
+
+def migrate_v2(cursor):
+    cursor.execute("ALTER TABLE history ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+    cursor.execute("ALTER TABLE history ADD COLUMN session_id TEXT NOT NULL DEFAULT ''")
+    create_indexes(cursor)
+
+
+def _log(cursor, now, expression, result, calc_type, user_id, session_id):
+    # Repeating the previous calculation of the same session bumps its count
+    # instead of adding a row
+    cursor.execute('''
+        UPDATE history SET count = count + 1, timestamp = ?
+        WHERE id = (SELECT MAX(id) FROM history WHERE user_id = ? AND session_id = ?)
+          AND expression = ? AND result = ? AND type = ?
+    ''', (now, user_id, session_id, expression, result, calc_type))
+    if cursor.rowcount == 0:
+        cursor.execute('''
+            INSERT INTO history (timestamp, expression, result, type, user_id, session_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (now, expression, result, calc_type, user_id, session_id))
+
+
+def log_calculation(expression, result, calc_type, db_path=DB_PATH, user_id='', session_id=''):
+    conn = connect(db_path)
+    _log(conn.cursor(), int(time.time()), expression, result, calc_type, user_id, session_id)
+    conn.commit()
+    conn.close()
+
+
+def log_calculations(entries, db_path=DB_PATH, user_id='', session_id=''):
+    # Writes a batch of (expression, result, type) entries in one transaction
+    now = int(time.time())
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    for expression, result, calc_type in entries:
+        _log(cursor, now, expression, result, calc_type, user_id, session_id)
+    conn.commit()
+    conn.close()
+
+
+def load_history(limit=None, db_path=DB_PATH, user_id=None, session_id=None):
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    query = 'SELECT timestamp, expression, result, type, count FROM history'
+    params = []
+    if user_id is not None:
+        query += ' WHERE user_id = ?'
+        params.append(user_id)
+        if session_id is not None:
+            query += ' AND session_id = ?'
+            params.append(session_id)
+    query += ' ORDER BY timestamp DESC, id DESC'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(int(limit))
+    rows = cursor.execute(query, params).fetchall()
+    conn.close()
+    return rows
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime(LEGACY_TIMESTAMP_FORMAT)
+
+
+def apply_retention(max_rows=MAX_ROWS, max_age_days=MAX_AGE_DAYS, db_path=DB_PATH):
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    deleted = 0
+    if max_age_days is not None:
+        cutoff = int(time.time()) - int(max_age_days * 86400)
+        cursor.execute('DELETE FROM history WHERE timestamp < ?', (cutoff,))
+        deleted += cursor.rowcount
+    if max_rows is not None:
+        # The row limit applies to each user, so a busy user of a shared
+        # database only trims their own history (the desktop app has one)
+        cursor.execute('''
+            DELETE FROM history WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id ORDER BY timestamp DESC, id DESC
+                    ) AS position
+                    FROM history
+                ) WHERE position > ?
+            )
+        ''', (max_rows,))
+        deleted += cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def compact(pages=VACUUM_PAGES, db_path=DB_PATH):
+    # Return up to `pages` free pages to the filesystem without the full
+    # rewrite (and exclusive lock) a plain VACUUM needs
+    conn = connect(db_path)
+    conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+    conn.close()
+
+
+class CompactionJob(threading.Thread):
+    def __init__(self, interval=COMPACTION_INTERVAL, max_rows=MAX_ROWS,
+                 max_age_days=MAX_AGE_DAYS, db_path=DB_PATH):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self.db_path = db_path
+        self._stop_event = threading.Event()
+
+    def run_once(self):
+        try:
+            apply_retention(self.max_rows, self.max_age_days, self.db_path)
+            analytics.prune(db_path=self.db_path)
+            compact(db_path=self.db_path)
+        except sqlite3.Error as e:
+            print(f"History compaction error: {str(e)}")
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ShardedHistory:
+    # Spreads users over several SQLite files by a stable hash of the user
+    # id, so concurrent writers mostly hold different database locks. With
+    # one shard it is just the regular history database.
+    def __init__(self, shards=1, directory='.', db_path=DB_PATH):
+        if shards < 1:
+            raise ValueError('At least one history shard is required')
+        if shards == 1:
+            self.paths = [db_path]
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.paths = [os.path.join(directory, f'history_shard_{i}.db') for i in range(shards)]
+        for path in self.paths:
+            init_db(path, wal=True)
+
+    def start_compaction(self, interval=COMPACTION_INTERVAL, max_rows=MAX_ROWS,
+                         max_age_days=MAX_AGE_DAYS):
+        # One retention and compaction job per shard file
+        jobs = [CompactionJob(interval, max_rows, max_age_days, path) for path in self.paths]
+        for job in jobs:
+            job.start()
+        return jobs
+
+    def path_for(self, user_id):
+        if len(self.paths) == 1:
+            return self.paths[0]
+        # Ids arrive from JSON and may be numbers; 42 and '42' are one user
+        digest = hashlib.sha1(str(user_id).encode('utf-8')).digest()
+        return self.paths[int.from_bytes(digest[:4], 'big') % len(self.paths)]
+
+    def log(self, user_id, session_id, expression, result, calc_type):
+        log_calculation(expression, result, calc_type, self.path_for(user_id),
+                        str(user_id), str(session_id))
+
+    def log_many(self, user_id, session_id, entries):
+        log_calculations(entries, self.path_for(user_id), str(user_id), str(session_id))
+
+    def load(self, user_id, session_id=None, limit=None):
+        if session_id is not None:
+            session_id = str(session_id)
+        return load_history(limit, self.path_for(user_id), str(user_id), session_id)
+
+    def record_errors(self, user_id, calc_type, count=1):
+        analytics.record_errors(calc_type, count, self.path_for(user_id))
+
+    def dashboard(self, top=analytics.TOP_EXPRESSIONS):
+        boards = [analytics.dashboard(path, top) for path in self.paths]
+        if len(boards) == 1:
+            return boards[0]
+        return analytics.merge_dashboards(boards, top)
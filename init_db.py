@@ -1,22 +1,9 @@
-import sqlite3
-
-DB_PATH = 'calculator_history.db'
+from history import DB_PATH, init_db as init_history_db
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            expression TEXT,
-            result TEXT,
-            type TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    # Creates the history table, or migrates an older database in place
+    init_history_db(DB_PATH)
     print('Database and table initialized successfully.')
 
 if __name__ == '__main__':
-    init_db() 
\ No newline at end of file
+    init_db() 
@@ -0,0 +1,41 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import history
+
+# Compares concurrent history write throughput of one database against
+# several user-hashed shards. Every writer process plays one user, the way
+# separate web server workers would.
+
+def writer(shards, directory, user, writes):
+    store = history.ShardedHistory(shards, directory, os.path.join(directory, 'single.db'))
+    for i in range(writes):
+        store.log(f'user-{user}', 'load-test', f'{i}+{user}', str(i + user), 'simple')
+
+def run(shards, writers, writes, directory):
+    # Create the databases up front so schema setup is not timed
+    history.ShardedHistory(shards, directory, os.path.join(directory, 'single.db'))
+    with multiprocessing.Pool(writers) as pool:
+        start = time.perf_counter()
+        pool.starmap(writer, [(shards, directory, user, writes) for user in range(writers)])
+        elapsed = time.perf_counter() - start
+    return writers * writes / elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='History write load test')
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 8])
+    args = parser.parse_args()
+
+    for shards in args.shards:
+        directory = tempfile.mkdtemp(prefix='history_load_')
+        try:
+            rate = run(shards, args.writers, args.writes, directory)
+        finally:
+            shutil.rmtree(directory)
+        print(f'{shards} shard(s): {rate:,.0f} writes/s with {args.writers} writers')
@@ -4,14 +4,23 @@ import os
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QStackedWidget, QLabel, QGridLayout, QLineEdit, QComboBox, QDialog, 
-    QTableWidget, QTableWidgetItem, QCheckBox, QMessageBox
+    QTableWidget, QTableWidgetItem, QCheckBox, QMessageBox, QShortcut
 )
-from PyQt5.QtCore import Qt, QMimeData
-from PyQt5.QtGui import QPalette, QColor, QIcon
+from PyQt5.QtCore import Qt, QMimeData, QPointF, QSettings, QThread, QTimer, pyqtSignal
+from PyQt5.QtGui import QPalette, QColor, QPainter, QPen, QPolygonF, QKeySequence
 import math
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+import button_evaluation
+from evaluator import ExpressionError, compile_expression
+from plotting import PlotSeries, SeriesCache, clamp_view, downsample
+from size_guide import SizeGuide
+from units import CATEGORIES, UnitError, convert, evaluate_conversion
+from currency import FileRateProvider, RateStore, RateUpdater
+import analytics
+import history
+import resource_manager
 
 class NavigationButton(QPushButton):
     def __init__(self, text):
@@ -35,7 +44,155 @@ class NavigationButton(QPushButton):
             }
         ''')
 
+class PlotCanvas(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setMinimumHeight(300)
+        self.cache = SeriesCache()
+        self.series = None
+        self.x_range = (-10.0, 10.0)
+        self.y_range = (-10.0, 10.0)
+        self.drag_start = None
+        self.points = None
+
+    def plot(self, expression, x_min, x_max, degrees=False):
+        if not x_min < x_max:
+            raise ValueError('x min must be less than x max')
+        self.series = PlotSeries(expression, degrees, self.cache)
+        self.x_range = clamp_view(x_min, x_max)
+        xs, ys = self.series.sample(*self.x_range)
+        finite = [y for y in ys if math.isfinite(y)]
+        if finite:
+            y_min, y_max = min(finite), max(finite)
+            pad = (y_max - y_min) * 0.1 or 1.0
+            self.y_range = clamp_view(y_min - pad, y_max + pad)
+        self.points = None
+        self.update()
+
+    def set_view(self, x_range, y_range):
+        # Zooming stops at the plotting limits instead of collapsing the view
+        self.x_range = clamp_view(*x_range)
+        self.y_range = clamp_view(*y_range)
+        # Resampling happens in paintEvent, so bursts of mouse events
+        # collapse into one sample per repaint
+        self.points = None
+        self.update()
+
+    def to_screen(self, x, y):
+        x_min, x_max = self.x_range
+        y_min, y_max = self.y_range
+        return QPointF((x - x_min) / (x_max - x_min) * self.width(),
+                       (y_max - y) / (y_max - y_min) * self.height())
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor('#001a33'))
+
+        painter.setPen(QPen(QColor('#003366'), 1))
+        origin = self.to_screen(0, 0)
+        painter.drawLine(QPointF(0, origin.y()), QPointF(self.width(), origin.y()))
+        painter.drawLine(QPointF(origin.x(), 0), QPointF(origin.x(), self.height()))
+
+        if self.series is None:
+            return
+        if self.points is None:
+            xs, ys = self.series.sample(*self.x_range)
+            self.points = downsample(xs, ys, self.width())
+
+        # Break the curve wherever the function is undefined
+        painter.setPen(QPen(QColor('white'), 2))
+        polyline = QPolygonF()
+        for x, y in zip(*self.points):
+            if math.isfinite(y) and abs(y) < 1e12:
+                polyline.append(self.to_screen(x, y))
+            elif polyline.size():
+                painter.drawPolyline(polyline)
+                polyline = QPolygonF()
+        if polyline.size():
+            painter.drawPolyline(polyline)
+
+    def mousePressEvent(self, event):
+        self.drag_start = (event.pos(), self.x_range, self.y_range)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_start is None:
+            return
+        pos, (x_min, x_max), (y_min, y_max) = self.drag_start
+        dx = (event.pos().x() - pos.x()) / self.width() * (x_max - x_min)
+        dy = (event.pos().y() - pos.y()) / self.height() * (y_max - y_min)
+        self.set_view((x_min - dx, x_max - dx), (y_min + dy, y_max + dy))
+
+    def mouseReleaseEvent(self, event):
+        self.drag_start = None
+
+    def wheelEvent(self, event):
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        x_min, x_max = self.x_range
+        y_min, y_max = self.y_range
+        # Zoom around the cursor
+        cx = x_min + event.pos().x() / self.width() * (x_max - x_min)
+        cy = y_max - event.pos().y() / self.height() * (y_max - y_min)
+        self.set_view((cx - (cx - x_min) * factor, cx + (x_max - cx) * factor),
+                      (cy - (cy - y_min) * factor, cy + (y_max - cy) * factor))
+
+
+class BatchEvaluator(QThread):
+    # Evaluates pasted lines off the UI thread, each exactly as the '='
+    # button would. Results are written to the history and reported in
+    # chunks, so a long paste costs a few dozen signals and transactions
+    # rather than one per line.
+    progress = pyqtSignal(int, int, int)
+    done = pyqtSignal(str, int, int)
+
+    CHUNK_SIZE = 500
+
+    def __init__(self, lines, calc_type, degrees=False):
+        super().__init__()
+        self.lines = lines
+        self.calc_type = calc_type
+        self.degrees = degrees
+
+    def evaluate(self, line):
+        if self.calc_type == 'scientific':
+            return button_evaluation.evaluate_scientific(line, self.degrees)
+        return button_evaluation.evaluate_simple(line)
+
+    def run(self):
+        errors = reported = 0
+        last = ''
+        chunk = []
+        try:
+            for i, line in enumerate(self.lines, start=1):
+                result, logged = self.evaluate(line)
+                if logged is None:
+                    errors += 1
+                else:
+                    last = result
+                    chunk.append((logged, result, self.calc_type))
+                if i % self.CHUNK_SIZE == 0 or i == len(self.lines):
+                    self.log_chunk(chunk, errors - reported)
+                    chunk = []
+                    reported = errors
+                    self.progress.emit(i, len(self.lines), errors)
+        finally:
+            # Always sent, so the display never stays on "Evaluating..."
+            self.done.emit(last, len(self.lines), errors)
+
+    def log_chunk(self, chunk, errors):
+        # A history problem must not stop the batch; results are still shown
+        try:
+            if chunk:
+                history.log_calculations(chunk)
+            if errors:
+                analytics.record_errors(self.calc_type, errors)
+        except sqlite3.Error as e:
+            print(f"Batch history error: {str(e)}")
+
+
 class Calculator(QMainWindow):
+    currency_rates_updated = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle('All-in-One Calculator')
@@ -45,34 +202,10 @@ class Calculator(QMainWindow):
         self.buttons = []
         self.units = {}
         
-        # Create resources directory if it doesn't exist
-        if not os.path.exists('resources'):
-            os.makedirs('resources')
-            
-        # Create default icons if they don't exist
-        self.create_default_icons()
-        
         self.init_database()
+        self.init_currency_rates()
         self.setup_ui()
-
-    def create_default_icons(self):
-        # Create a simple text-based icon for copy
-        copy_icon_path = os.path.join('resources', 'copy_icon.png')
-        if not os.path.exists(copy_icon_path):
-            from PIL import Image, ImageDraw, ImageFont
-            img = Image.new('RGB', (32, 32), color='white')
-            d = ImageDraw.Draw(img)
-            d.text((8, 8), 'C', fill='black')
-            img.save(copy_icon_path)
-
-        # Create a simple text-based icon for export
-        export_icon_path = os.path.join('resources', 'export_icon.png')
-        if not os.path.exists(export_icon_path):
-            from PIL import Image, ImageDraw, ImageFont
-            img = Image.new('RGB', (32, 32), color='white')
-            d = ImageDraw.Draw(img)
-            d.text((8, 8), 'E', fill='black')
-            img.save(export_icon_path)
+        self.restore_state()
 
     def setup_ui(self):
         self.setStyleSheet('''
@@ -134,7 +267,8 @@ class Calculator(QMainWindow):
             ('Scientific Calc', 1),
             ('Unit Converter', 2),
             ('Size Guide', 3),
-            ('History', 4)
+            ('History', 4),
+            ('Plot', 5)
         ]
         for text, idx in nav_items:
             btn = NavigationButton(text)
@@ -143,13 +277,20 @@ class Calculator(QMainWindow):
             self.buttons.append(btn)
         nav_layout.addStretch(1)
 
-        # Stacked widget for pages
+        # Stacked widget for pages. Pages are built the first time they are
+        # shown, so startup only pays for the page the app opens on.
         self.stacked_widget = QStackedWidget()
-        self.stacked_widget.addWidget(self.create_simple_calculator_page())
-        self.stacked_widget.addWidget(self.create_scientific_calculator_page())
-        self.stacked_widget.addWidget(self.create_unit_converter_page())
-        self.stacked_widget.addWidget(self.create_size_guide_page())
-        self.stacked_widget.addWidget(self.create_history_page())
+        self.page_factories = [
+            self.create_simple_calculator_page,
+            self.create_scientific_calculator_page,
+            self.create_unit_converter_page,
+            self.create_size_guide_page,
+            self.create_history_page,
+            self.create_plot_page
+        ]
+        self.pages = [None] * len(self.page_factories)
+        for _ in self.page_factories:
+            self.stacked_widget.addWidget(QWidget())
 
         main_layout.addWidget(nav_widget)
         main_layout.addWidget(self.stacked_widget)
@@ -167,35 +308,134 @@ class Calculator(QMainWindow):
         ''')
         main_layout.addWidget(self.theme_toggle, alignment=Qt.AlignTop | Qt.AlignRight)
 
+        self.setup_keyboard()
+
+    def setup_keyboard(self):
+        # Keys that map onto calculator buttons; printable characters in
+        # TYPED_CHARACTERS go straight to the display
+        self.key_map = {
+            Qt.Key_Return: '=',
+            Qt.Key_Enter: '=',
+            Qt.Key_Equal: '=',
+            Qt.Key_Escape: 'C',
+            Qt.Key_Delete: 'C',
+        }
+        self.typed_characters = set('0123456789.+-*/%^()!')
+        # Keystrokes are buffered and written to the display once per event
+        # loop pass, so key repeat and fast typing don't repaint per key
+        self.pending_input = ''
+        self.input_timer = QTimer(self)
+        self.input_timer.setSingleShot(True)
+        self.input_timer.setInterval(0)
+        self.input_timer.timeout.connect(self.flush_pending_input)
+        self.batch_evaluator = None
+
+        paste_shortcut = QShortcut(QKeySequence.Paste, self)
+        paste_shortcut.activated.connect(self.paste_input)
+
+    def active_display(self):
+        index = self.stacked_widget.currentIndex()
+        if index == 0:
+            return self.display, self.on_button_click
+        if index == 1:
+            if self.data_input.hasFocus():
+                # Keys belong to the data mode field, not the button display
+                return None, None
+            return self.scientific_display, self.on_scientific_button_click
+        return None, None
+
+    def keyPressEvent(self, event):
+        display, handler = self.active_display()
+        if display is None:
+            super().keyPressEvent(event)
+            return
+        if event.key() == Qt.Key_Backspace:
+            self.flush_pending_input()
+            display.setText(display.text()[:-1])
+        elif event.key() in self.key_map:
+            self.flush_pending_input()
+            handler(self.key_map[event.key()])
+        elif event.text() and event.text() in self.typed_characters:
+            self.pending_input += event.text()
+            self.input_timer.start()
+        else:
+            super().keyPressEvent(event)
+
+    def flush_pending_input(self):
+        self.input_timer.stop()
+        display, _ = self.active_display()
+        if self.pending_input and display is not None:
+            display.setText(display.text() + self.pending_input)
+        self.pending_input = ''
+
+    def paste_input(self):
+        display, _ = self.active_display()
+        if display is None:
+            return
+        lines = [line.strip() for line in QApplication.clipboard().text().splitlines()]
+        lines = [line for line in lines if line]
+        if not lines:
+            return
+        self.flush_pending_input()
+        if self.batch_evaluator is not None and self.batch_evaluator.isRunning():
+            QMessageBox.information(self, "Busy", "A pasted batch is still being evaluated.")
+            return
+        # Every line, even a single one, is evaluated in the background the
+        # way '=' would evaluate it
+        scientific = display is self.scientific_display
+        degrees = scientific and not self.degree_radian_toggle.isChecked()
+        self.batch_display = display
+        self.batch_evaluator = BatchEvaluator(lines, 'scientific' if scientific else 'simple', degrees)
+        self.batch_evaluator.progress.connect(self.on_batch_progress)
+        self.batch_evaluator.done.connect(self.on_batch_done)
+        display.setText(f'Evaluating 0/{len(lines)}...')
+        self.batch_evaluator.start()
+
+    def on_batch_progress(self, completed, total, errors):
+        self.batch_display.setText(f'Evaluating {completed}/{total}...')
+
+    def on_batch_done(self, last_result, total, errors):
+        self.batch_display.setText(last_result)
+        if self.pages[4] is not None:
+            self.load_history()
+        if errors:
+            QMessageBox.warning(self, "Batch Complete",
+                                f"Evaluated {total} lines; {errors} could not be evaluated.")
+
     def init_database(self):
         try:
-            conn = sqlite3.connect('calculator_history.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT,
-                    expression TEXT,
-                    result TEXT,
-                    type TEXT
-                )
-            ''')
-            conn.commit()
-            conn.close()
+            history.init_db()
+            # Retention and incremental VACUUM run off the UI thread
+            self.compaction_job = history.CompactionJob()
+            self.compaction_job.start()
         except Exception as e:
             print(f"Database initialization error: {str(e)}")
             QMessageBox.warning(self, "Database Error", 
                               "Failed to initialize database. History feature may not work properly.")
 
+    def init_currency_rates(self):
+        # Rates are served from a snapshot of the local store. Loading it and
+        # the provider refresh both run in the background, and the dropdowns
+        # update when either finishes
+        self.rate_store = RateStore()
+        self.currency_rates_updated.connect(self.on_currency_rates_updated)
+        self.rate_updater = RateUpdater(self.rate_store, FileRateProvider(),
+                                        on_update=self.currency_rates_updated.emit)
+        self.rate_updater.start()
+
+    def on_currency_rates_updated(self):
+        if self.pages[2] is not None and self.category.currentText() == 'Currency':
+            self.update_unit_dropdowns('Currency')
+
     def log_calculation(self, expression, result, calc_type):
-        conn = sqlite3.connect('calculator_history.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO history (timestamp, expression, result, type)
-            VALUES (?, ?, ?, ?)
-        ''', (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), expression, result, calc_type))
-        conn.commit()
-        conn.close()
+        history.log_calculation(expression, result, calc_type)
+
+    def log_error(self, calc_type):
+        # Called from error handlers, so a database problem must not escape
+        try:
+            analytics.record_errors(calc_type)
+        except sqlite3.Error as e:
+            print(f"Analytics error: {str(e)}")
 
     def create_simple_calculator_page(self):
         page = QWidget()
@@ -239,12 +479,12 @@ class Calculator(QMainWindow):
         action_layout = QHBoxLayout()
         copy_button = QPushButton('Copy Result')
         copy_button.clicked.connect(self.copy_result)
-        copy_button.setIcon(QIcon(os.path.join('resources', 'copy_icon.png')))
+        copy_button.setIcon(resource_manager.icon('copy'))
         action_layout.addWidget(copy_button)
 
         export_button = QPushButton('Export PDF')
         export_button.clicked.connect(self.export_pdf)
-        export_button.setIcon(QIcon(os.path.join('resources', 'export_icon.png')))
+        export_button.setIcon(resource_manager.icon('export'))
         action_layout.addWidget(export_button)
 
         layout.addLayout(action_layout)
@@ -255,23 +495,15 @@ class Calculator(QMainWindow):
         if text == 'C':
             self.display.clear()
         elif text == '=':
-            try:
-                expr = self.display.text()
-                if not expr:
-                    return
-                result = eval(expr)
-                if isinstance(result, (int, float)):
-                    if result == float('inf') or result == float('-inf'):
-                        self.display.setText('Error: Division by zero')
-                    else:
-                        self.display.setText(str(result))
-                        self.log_calculation(expr, str(result), 'simple')
-                else:
-                    self.display.setText('Error: Invalid result')
-            except ZeroDivisionError:
-                self.display.setText('Error: Division by zero')
-            except Exception as e:
-                self.display.setText('Error: Invalid input')
+            expr = self.display.text()
+            if not expr:
+                return
+            result, logged = button_evaluation.evaluate_simple(expr)
+            self.display.setText(result)
+            if logged is None:
+                self.log_error('simple')
+            else:
+                self.log_calculation(logged, result, 'simple')
         else:
             self.display.setText(self.display.text() + text)
 
@@ -373,6 +605,21 @@ class Calculator(QMainWindow):
         # Initial button set
         self.show_button_set('basic')
 
+        # Data mode: statistics and matrix functions typed as one expression
+        self.data_input = QLineEdit()
+        self.data_input.setPlaceholderText('Data: mean([1, 2, 3]), det([[1, 2], [3, 4]]), linreg([1, 2, 3], [2, 4, 7])')
+        self.data_input.setStyleSheet('''
+            QLineEdit {
+                background-color: #001a33;
+                color: white;
+                border: 1px solid #003366;
+                padding: 10px;
+                font-size: 18px;
+            }
+        ''')
+        self.data_input.returnPressed.connect(self.evaluate_data_expression)
+        layout.addWidget(self.data_input)
+
         return page
 
     def show_button_set(self, set_name):
@@ -438,50 +685,34 @@ class Calculator(QMainWindow):
         else:
             self.degree_radian_toggle.setText('Degree')
 
+    def evaluate_data_expression(self):
+        text = self.data_input.text()
+        if not text.strip():
+            return
+        degrees = not self.degree_radian_toggle.isChecked()
+        try:
+            result = compile_expression(text, (), degrees)()
+        except (ArithmeticError, ValueError, TypeError) as e:
+            self.scientific_display.setText(f'Error: {str(e)}')
+            self.log_error('data')
+            return
+        self.scientific_display.setText(str(result))
+        self.log_calculation(text, str(result), 'data')
+
     def on_scientific_button_click(self, text):
         if text == 'C':
             self.scientific_display.clear()
         elif text == '=':
-            try:
-                expr = self.scientific_display.text()
-                if not expr:
-                    return
-                # Replace scientific functions with math module equivalents
-                expr = expr.replace('sin', 'math.sin')
-                expr = expr.replace('cos', 'math.cos')
-                expr = expr.replace('tan', 'math.tan')
-                expr = expr.replace('sinh', 'math.sinh')
-                expr = expr.replace('cosh', 'math.cosh')
-                expr = expr.replace('tanh', 'math.tanh')
-                expr = expr.replace('log', 'math.log10')
-                expr = expr.replace('ln', 'math.log')
-                expr = expr.replace('sqrt', 'math.sqrt')
-                expr = expr.replace('^', '**')
-                expr = expr.replace('π', 'math.pi')
-                expr = expr.replace('e', 'math.e')
-                expr = expr.replace('phi', '1.618033988749895')
-
-                # Convert degrees to radians if in degree mode
-                if not self.degree_radian_toggle.isChecked():
-                    expr = expr.replace('math.sin', 'math.sin(math.radians')
-                    expr = expr.replace('math.cos', 'math.cos(math.radians')
-                    expr = expr.replace('math.tan', 'math.tan(math.radians')
-
-                # Secure evaluation
-                allowed_names = {'math': math}
-                result = eval(expr, {"__builtins__": {}}, allowed_names)
-                if isinstance(result, (int, float)):
-                    if result == float('inf') or result == float('-inf'):
-                        self.scientific_display.setText('Error: Division by zero')
-                    else:
-                        self.scientific_display.setText(str(result))
-                        self.log_calculation(expr, str(result), 'scientific')
-                else:
-                    self.scientific_display.setText('Error: Invalid result')
-            except ZeroDivisionError:
-                self.scientific_display.setText('Error: Division by zero')
-            except Exception as e:
-                self.scientific_display.setText('Error: Invalid input')
+            expr = self.scientific_display.text()
+            if not expr:
+                return
+            degrees = not self.degree_radian_toggle.isChecked()
+            result, logged = button_evaluation.evaluate_scientific(expr, degrees)
+            self.scientific_display.setText(result)
+            if logged is None:
+                self.log_error('scientific')
+            else:
+                self.log_calculation(logged, result, 'scientific')
         else:
             self.scientific_display.setText(self.scientific_display.text() + text)
 
@@ -492,7 +723,7 @@ class Calculator(QMainWindow):
 
         # Category dropdown
         self.category = QComboBox()
-        self.category.addItems(['Length', 'Weight', 'Volume', 'Temperature'])
+        self.category.addItems(list(CATEGORIES) + ['Currency'])
         self.category.setStyleSheet('''
             QComboBox {
                 background-color: #001f3f;
@@ -571,6 +802,13 @@ class Calculator(QMainWindow):
         self.convert_button.clicked.connect(self.convert_units)
         layout.addWidget(self.convert_button)
 
+        # Free-form conversion, e.g. "60 mi/h to m/s" or "3 ft 4 in + 12 cm in m"
+        self.conversion_expression = QLineEdit()
+        self.conversion_expression.setPlaceholderText('Or type a conversion, e.g. 60 mi/h to m/s')
+        self.conversion_expression.setStyleSheet(self.input_value.styleSheet())
+        self.conversion_expression.returnPressed.connect(self.convert_expression)
+        layout.addWidget(self.conversion_expression)
+
         # Result label
         self.result_label = QLabel('Result: ')
         self.result_label.setStyleSheet('font-size: 24px; color: white; font-family: "Montserrat", "Poppins", sans-serif;')
@@ -585,101 +823,68 @@ class Calculator(QMainWindow):
     def update_unit_dropdowns(self, category):
         self.from_unit.clear()
         self.to_unit.clear()
-        if category == 'Length':
-            units = ['cm', 'm', 'km', 'in', 'ft']
-        elif category == 'Weight':
-            units = ['g', 'kg', 'lb', 'oz']
-        elif category == 'Volume':
-            units = ['ml', 'l', 'gal']
-        elif category == 'Temperature':
-            units = ['C', 'F', 'K']
+        if category == 'Currency':
+            units = self.rate_store.currencies()
+        else:
+            units = CATEGORIES.get(category, [])
         self.from_unit.addItems(units)
         self.to_unit.addItems(units)
 
     def convert_units(self):
-        category = self.category.currentText()
         from_unit = self.from_unit.currentText()
         to_unit = self.to_unit.currentText()
         try:
-            value = float(self.input_value.text())
-            if category == 'Length':
-                # Convert to meters first
-                if from_unit == 'cm':
-                    value = value / 100
-                elif from_unit == 'km':
-                    value = value * 1000
-                elif from_unit == 'in':
-                    value = value * 0.0254
-                elif from_unit == 'ft':
-                    value = value * 0.3048
-                # Convert from meters to target unit
-                if to_unit == 'cm':
-                    value = value * 100
-                elif to_unit == 'km':
-                    value = value / 1000
-                elif to_unit == 'in':
-                    value = value / 0.0254
-                elif to_unit == 'ft':
-                    value = value / 0.3048
-            elif category == 'Weight':
-                # Convert to kilograms first
-                if from_unit == 'g':
-                    value = value / 1000
-                elif from_unit == 'lb':
-                    value = value * 0.453592
-                elif from_unit == 'oz':
-                    value = value * 0.0283495
-                # Convert from kilograms to target unit
-                if to_unit == 'g':
-                    value = value * 1000
-                elif to_unit == 'lb':
-                    value = value / 0.453592
-                elif to_unit == 'oz':
-                    value = value / 0.0283495
-            elif category == 'Volume':
-                # Convert to liters first
-                if from_unit == 'ml':
-                    value = value / 1000
-                elif from_unit == 'gal':
-                    value = value * 3.78541
-                # Convert from liters to target unit
-                if to_unit == 'ml':
-                    value = value * 1000
-                elif to_unit == 'gal':
-                    value = value / 3.78541
-            elif category == 'Temperature':
-                # Convert to Celsius first
-                if from_unit == 'F':
-                    value = (value - 32) * 5 / 9
-                elif from_unit == 'K':
-                    value = value - 273.15
-                # Convert from Celsius to target unit
-                if to_unit == 'F':
-                    value = value * 9 / 5 + 32
-                elif to_unit == 'K':
-                    value = value + 273.15
+            if self.category.currentText() == 'Currency':
+                value = self.rate_store.convert(float(self.input_value.text()), from_unit, to_unit)
+            else:
+                value = convert(float(self.input_value.text()), from_unit, to_unit)
             self.result_label.setText(f'Result: {value:.2f} {to_unit}')
         except ValueError:
             self.result_label.setText('Error: Invalid input')
 
+    def convert_expression(self):
+        text = self.conversion_expression.text()
+        if not text.strip():
+            return
+        try:
+            value, unit = evaluate_conversion(text)
+            self.result_label.setText(f'Result: {value:.6g} {unit}')
+            self.log_calculation(text, f'{value:.6g} {unit}', 'conversion')
+        except UnitError as e:
+            self.result_label.setText(f'Error: {str(e)}')
+            self.log_error('conversion')
+
     def create_size_guide_page(self):
         page = QWidget()
         layout = QVBoxLayout(page)
         layout.setContentsMargins(20, 20, 20, 20)
 
-        # Gender dropdown
+        try:
+            self.size_guide = SizeGuide.load()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Size chart loading error: {str(e)}")
+            self.size_guide = SizeGuide([])
+
+        # Region, brand, garment and gender dropdowns
+        self.size_region = QComboBox()
+        self.size_brand = QComboBox()
+        self.size_garment = QComboBox()
         self.gender = QComboBox()
-        self.gender.addItems(['Male', 'Female'])
-        self.gender.setStyleSheet('''
-            QComboBox {
-                background-color: #001f3f;
-                color: white;
-                border: 1px solid #003366;
-                padding: 5px;
-                font-size: 16px;
-            }
-        ''')
-        layout.addWidget(self.gender)
+        for combo in [self.size_region, self.size_brand, self.size_garment, self.gender]:
+            combo.setStyleSheet('''
+                QComboBox {
+                    background-color: #001f3f;
+                    color: white;
+                    border: 1px solid #003366;
+                    padding: 5px;
+                    font-size: 16px;
+                }
+            ''')
+            layout.addWidget(combo)
+        self.size_region.currentTextChanged.connect(self.update_size_brands)
+        self.size_brand.currentTextChanged.connect(self.update_size_garments)
+        self.size_garment.currentTextChanged.connect(self.update_size_genders)
+        self.size_region.addItems(self.size_guide.regions())
 
         # Input fields
         self.height = QLineEdit()
@@ -785,33 +990,34 @@ class Calculator(QMainWindow):
 
         return page
 
+    def update_size_brands(self, region):
+        self.size_brand.clear()
+        self.size_brand.addItems(self.size_guide.brands(region))
+
+    def update_size_garments(self, brand):
+        self.size_garment.clear()
+        self.size_garment.addItems(self.size_guide.garments(self.size_region.currentText(), brand))
+
+    def update_size_genders(self, garment):
+        gender = self.gender.currentText()
+        self.gender.clear()
+        self.gender.addItems(self.size_guide.genders(
+            self.size_region.currentText(), self.size_brand.currentText(), garment))
+        if gender:
+            self.gender.setCurrentText(gender)
+
     def calculate_size(self):
         try:
-            height = float(self.height.text())
-            weight = float(self.weight.text())
-            chest = float(self.chest.text())
-            waist = float(self.waist.text())
-            gender = self.gender.currentText()
-
-            # Simple size calculation logic
-            if gender == 'Male':
-                if chest < 90 and waist < 80:
-                    size = 'S'
-                elif chest < 100 and waist < 90:
-                    size = 'M'
-                elif chest < 110 and waist < 100:
-                    size = 'L'
-                else:
-                    size = 'XL'
-            else:  # Female
-                if chest < 85 and waist < 70:
-                    size = 'S'
-                elif chest < 95 and waist < 80:
-                    size = 'M'
-                elif chest < 105 and waist < 90:
-                    size = 'L'
-                else:
-                    size = 'XL'
+            # Blank fields are skipped; the chart uses whichever measurements it defines
+            measurements = {}
+            for name, field in [('height', self.height), ('weight', self.weight),
+                                ('chest', self.chest), ('waist', self.waist)]:
+                if field.text().strip():
+                    measurements[name] = float(field.text())
+
+            size = self.size_guide.recommend(
+                self.size_region.currentText(), self.size_brand.currentText(),
+                self.size_garment.currentText(), self.gender.currentText(), **measurements)
 
             self.size_result.setText(f'Recommended Size: {size}')
         except ValueError:
@@ -826,17 +1032,9 @@ class Calculator(QMainWindow):
         layout = QVBoxLayout(chart_dialog)
 
         # Size chart content
-        chart_text = QLabel('Size Chart:\n\n'
-                           'Male:\n'
-                           'S: Chest < 90cm, Waist < 80cm\n'
-                           'M: Chest < 100cm, Waist < 90cm\n'
-                           'L: Chest < 110cm, Waist < 100cm\n'
-                           'XL: Chest >= 110cm, Waist >= 100cm\n\n'
-                           'Female:\n'
-                           'S: Chest < 85cm, Waist < 70cm\n'
-                           'M: Chest < 95cm, Waist < 80cm\n'
-                           'L: Chest < 105cm, Waist < 90cm\n'
-                           'XL: Chest >= 105cm, Waist >= 90cm')
+        chart_text = QLabel(self.size_guide.describe(
+            self.size_region.currentText(), self.size_brand.currentText(),
+            self.size_garment.currentText()))
         chart_text.setStyleSheet('font-size: 16px;')
         layout.addWidget(chart_text)
 
@@ -863,12 +1061,7 @@ class Calculator(QMainWindow):
         page = QWidget()
         layout = QVBoxLayout(page)
         layout.setContentsMargins(20, 20, 20, 20)
-
-        # Table view for history
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(4)
-        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'Expression', 'Result', 'Type'])
-        self.history_table.setStyleSheet('''
+        table_style = '''
             QTableWidget {
                 background-color: #001a33;
                 color: white;
@@ -884,8 +1077,33 @@ class Calculator(QMainWindow):
                 border: 1px solid #003366;
                 padding: 5px;
             }
-        ''')
-        layout.addWidget(self.history_table)
+        '''
+
+        # Usage dashboard, read from the analytics aggregates
+        self.stats_summary = QLabel()
+        self.stats_summary.setStyleSheet('font-size: 16px; color: white; font-family: "Montserrat", "Poppins", sans-serif;')
+        layout.addWidget(self.stats_summary)
+
+        stats_layout = QHBoxLayout()
+        self.stats_types_table = QTableWidget()
+        self.stats_types_table.setColumnCount(4)
+        self.stats_types_table.setHorizontalHeaderLabels(['Type', 'Calculations', 'Errors', 'Error Rate'])
+        self.stats_types_table.setStyleSheet(table_style)
+        stats_layout.addWidget(self.stats_types_table)
+
+        self.stats_top_table = QTableWidget()
+        self.stats_top_table.setColumnCount(3)
+        self.stats_top_table.setHorizontalHeaderLabels(['Top Expression', 'Type', 'Count'])
+        self.stats_top_table.setStyleSheet(table_style)
+        stats_layout.addWidget(self.stats_top_table)
+        layout.addLayout(stats_layout)
+
+        # Table view for history
+        self.history_table = QTableWidget()
+        self.history_table.setColumnCount(5)
+        self.history_table.setHorizontalHeaderLabels(['Timestamp', 'Expression', 'Result', 'Type', 'Count'])
+        self.history_table.setStyleSheet(table_style)
+        layout.addWidget(self.history_table, 1)
 
         # Load history data
         self.load_history()
@@ -893,18 +1111,155 @@ class Calculator(QMainWindow):
         return page
 
     def load_history(self):
-        conn = sqlite3.connect('calculator_history.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT timestamp, expression, result, type FROM history ORDER BY timestamp DESC')
-        rows = cursor.fetchall()
+        rows = history.load_history()
         self.history_table.setRowCount(len(rows))
-        for i, row in enumerate(rows):
-            for j, value in enumerate(row):
+        for i, (timestamp, *values) in enumerate(rows):
+            self.history_table.setItem(i, 0, QTableWidgetItem(history.format_timestamp(timestamp)))
+            for j, value in enumerate(values, start=1):
                 self.history_table.setItem(i, j, QTableWidgetItem(str(value)))
-        conn.close()
+        self.load_stats()
+
+    def load_stats(self):
+        try:
+            stats = analytics.dashboard()
+        except sqlite3.Error as e:
+            self.stats_summary.setText(f'Statistics unavailable: {str(e)}')
+            return
+        last_day = sum(entry['calculations'] for entry in stats['hourly'])
+        last_month = sum(entry['calculations'] for entry in stats['daily'])
+        self.stats_summary.setText(
+            f'Last 24 hours: {last_day} calculations    '
+            f'Last {analytics.DASHBOARD_DAYS} days: {last_month} calculations')
+
+        self.stats_types_table.setRowCount(len(stats['types']))
+        for i, entry in enumerate(stats['types']):
+            values = [entry['type'], entry['calculations'], entry['errors'],
+                      f"{entry['error_rate']:.1%}"]
+            for j, value in enumerate(values):
+                self.stats_types_table.setItem(i, j, QTableWidgetItem(str(value)))
+
+        self.stats_top_table.setRowCount(len(stats['top_expressions']))
+        for i, entry in enumerate(stats['top_expressions']):
+            values = [entry['expression'], entry['type'], entry['count']]
+            for j, value in enumerate(values):
+                self.stats_top_table.setItem(i, j, QTableWidgetItem(str(value)))
+
+    def create_plot_page(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        layout.setContentsMargins(20, 20, 20, 20)
+
+        # Expression and range inputs
+        self.plot_expression = QLineEdit()
+        self.plot_expression.setPlaceholderText('f(x), e.g. sin(x) / x')
+        layout.addWidget(self.plot_expression)
+
+        range_layout = QHBoxLayout()
+        self.plot_x_min = QLineEdit('-10')
+        self.plot_x_min.setPlaceholderText('x min')
+        self.plot_x_max = QLineEdit('10')
+        self.plot_x_max.setPlaceholderText('x max')
+        range_layout.addWidget(self.plot_x_min)
+        range_layout.addWidget(self.plot_x_max)
+        layout.addLayout(range_layout)
+
+        self.plot_degrees = QCheckBox('Degrees')
+        layout.addWidget(self.plot_degrees)
+
+        plot_button = QPushButton('Plot')
+        plot_button.clicked.connect(self.plot_expression_clicked)
+        layout.addWidget(plot_button)
+
+        self.plot_canvas = PlotCanvas()
+        layout.addWidget(self.plot_canvas, 1)
+
+        self.plot_status = QLabel('Drag to pan, scroll to zoom')
+        layout.addWidget(self.plot_status)
+
+        return page
+
+    def plot_expression_clicked(self):
+        try:
+            x_min = float(self.plot_x_min.text())
+            x_max = float(self.plot_x_max.text())
+            self.plot_canvas.plot(self.plot_expression.text(), x_min, x_max,
+                                  self.plot_degrees.isChecked())
+            self.plot_status.setText('Drag to pan, scroll to zoom')
+        except ExpressionError as e:
+            self.plot_status.setText(f'Error: {str(e)}')
+        except ValueError:
+            self.plot_status.setText('Error: Invalid range')
+
+    def ensure_page(self, index):
+        if self.pages[index] is not None:
+            return
+        page = self.page_factories[index]()
+        placeholder = self.stacked_widget.widget(index)
+        self.stacked_widget.insertWidget(index, page)
+        self.stacked_widget.removeWidget(placeholder)
+        placeholder.deleteLater()
+        self.pages[index] = page
+        self.restore_page_state(index)
 
     def switch_page(self, index):
+        self.ensure_page(index)
         self.stacked_widget.setCurrentIndex(index)
+        for i, button in enumerate(self.buttons):
+            button.setChecked(i == index)
+        self.schedule_save_state()
+
+    def restore_state(self):
+        # Settings are only read here and written from save_state; QSettings
+        # flushes them to disk from the event loop, off the input path
+        self.settings = QSettings('AllInOneCalculator', 'AllInOneCalculator')
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(500)
+        self.save_timer.timeout.connect(self.save_state)
+
+        self.theme_toggle.setChecked(self.settings.value('theme/dark', False, type=bool))
+        self.theme_toggle.stateChanged.connect(self.schedule_save_state)
+        page = self.settings.value('ui/page', 0, type=int)
+        self.switch_page(page if 0 <= page < len(self.pages) else 0)
+
+    def restore_page_state(self, index):
+        if not hasattr(self, 'settings'):
+            return
+        if index == 1:
+            radians = self.settings.value('scientific/radians', False, type=bool)
+            self.degree_radian_toggle.setChecked(radians)
+            self.toggle_degree_radian()
+            self.degree_radian_toggle.clicked.connect(self.schedule_save_state)
+        elif index == 2:
+            category = self.settings.value('converter/category', '', type=str)
+            if category:
+                self.category.setCurrentText(category)
+            self.from_unit.setCurrentText(self.settings.value('converter/from', '', type=str))
+            self.to_unit.setCurrentText(self.settings.value('converter/to', '', type=str))
+            for combo in [self.category, self.from_unit, self.to_unit]:
+                combo.currentTextChanged.connect(self.schedule_save_state)
+
+    def schedule_save_state(self, *args):
+        # Coalesce bursts of changes into one write
+        if hasattr(self, 'save_timer'):
+            self.save_timer.start()
+
+    def save_state(self):
+        self.settings.setValue('ui/page', self.stacked_widget.currentIndex())
+        self.settings.setValue('theme/dark', self.theme_toggle.isChecked())
+        # Pages that were never opened keep their previously saved state
+        if self.pages[1] is not None:
+            self.settings.setValue('scientific/radians', self.degree_radian_toggle.isChecked())
+        if self.pages[2] is not None:
+            self.settings.setValue('converter/category', self.category.currentText())
+            self.settings.setValue('converter/from', self.from_unit.currentText())
+            self.settings.setValue('converter/to', self.to_unit.currentText())
+
+    def closeEvent(self, event):
+        if hasattr(self, 'settings'):
+            self.save_state()
+            self.settings.sync()
+        super().closeEvent(event)
 
     def toggle_theme(self, state):
         if state == Qt.Checked:
@@ -995,6 +1350,9 @@ if __name__ == '__main__':
         app = QApplication(sys.argv)
         calculator = Calculator()
         calculator.show()
+        if os.environ.get('CALCULATOR_EXIT_AFTER_STARTUP'):
+            # Used by build.py to time a cold start
+            QTimer.singleShot(0, app.quit)
         sys.exit(app.exec_())
     except Exception as e:
         print(f"Error starting application: {str(e)}")
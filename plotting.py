@@ -0,0 +1,192 @@
+import bisect
+import math
+from collections import OrderedDict
+
+from evaluator import compile_expression
+
+DEFAULT_SAMPLES = 200
+MAX_DEPTH = 8
+MAX_POINTS = 20000
+CURVATURE_TOLERANCE = 1e-3
+CACHE_SIZE = 32
+# Zoom limits for a view range; a zero-width view would divide by zero when
+# sampling and drawing
+MIN_VIEW_WIDTH = 1e-9
+MAX_VIEW_WIDTH = 1e12
+# Narrower views than this, relative to their centre, run out of distinct
+# float values
+MIN_RELATIVE_WIDTH = 1e-9
+
+
+def _finite(value):
+    return isinstance(value, float) and math.isfinite(value)
+
+
+def _merge(xs, ys, new_xs, new_ys):
+    # Both inputs are sorted by x, so a single linear pass is enough
+    merged_xs, merged_ys = [], []
+    i = j = 0
+    while i < len(xs) or j < len(new_xs):
+        if j >= len(new_xs) or (i < len(xs) and xs[i] <= new_xs[j]):
+            merged_xs.append(xs[i])
+            merged_ys.append(ys[i])
+            i += 1
+        else:
+            merged_xs.append(new_xs[j])
+            merged_ys.append(new_ys[j])
+            j += 1
+    return merged_xs, merged_ys
+
+
+def adaptive_sample(compiled, x_min, x_max, samples=DEFAULT_SAMPLES,
+                    max_depth=MAX_DEPTH, tolerance=CURVATURE_TOLERANCE):
+    if x_max <= x_min:
+        raise ValueError('x max must be greater than x min')
+    samples = max(samples, 3)
+    step = (x_max - x_min) / (samples - 1)
+    xs = [x_min + i * step for i in range(samples)]
+    xs[-1] = x_max
+    ys = compiled.evaluate_many(xs)
+    min_width = (x_max - x_min) * 1e-9
+
+    for _ in range(max_depth):
+        finite = [y for y in ys if _finite(y)]
+        scale = (max(finite) - min(finite)) if finite else 0.0
+        scale = scale or 1.0
+
+        # Flag both segments around any point that bends away from the chord
+        # through its neighbours, or that sits next to a discontinuity
+        flagged = set()
+        for i in range(1, len(xs) - 1):
+            y0, y1, y2 = ys[i - 1], ys[i], ys[i + 1]
+            if not (_finite(y0) and _finite(y1) and _finite(y2)):
+                if _finite(y0) or _finite(y1) or _finite(y2):
+                    flagged.update((i - 1, i))
+                continue
+            t = (xs[i] - xs[i - 1]) / (xs[i + 1] - xs[i - 1])
+            if abs(y1 - (y0 + (y2 - y0) * t)) > tolerance * scale:
+                flagged.update((i - 1, i))
+
+        segments = [i for i in sorted(flagged) if xs[i + 1] - xs[i] > min_width]
+        if not segments or len(xs) + len(segments) > MAX_POINTS:
+            break
+        new_xs = [(xs[i] + xs[i + 1]) / 2 for i in segments]
+        new_ys = compiled.evaluate_many(new_xs)
+        xs, ys = _merge(xs, ys, new_xs, new_ys)
+
+    return xs, ys
+
+
+def clamp_view(lo, hi):
+    # Widens or narrows the range around its centre to the zoom limits
+    centre = (lo + hi) / 2
+    min_width = max(MIN_VIEW_WIDTH, abs(centre) * MIN_RELATIVE_WIDTH)
+    width = min(max(hi - lo, min_width), MAX_VIEW_WIDTH)
+    if width == hi - lo:
+        return lo, hi
+    return centre - width / 2, centre + width / 2
+
+
+def downsample(xs, ys, buckets):
+    # Keep the first, min, max and last point of every pixel column so spikes
+    # survive while the point count stays proportional to the widget width
+    if buckets <= 0 or len(xs) <= buckets * 4:
+        return xs, ys
+    x_min, x_max = xs[0], xs[-1]
+    width = (x_max - x_min) / buckets or 1.0
+    out_xs, out_ys = [], []
+    start = 0
+    for bucket in range(buckets):
+        edge = x_min + (bucket + 1) * width
+        end = start
+        while end < len(xs) and (xs[end] < edge or bucket == buckets - 1):
+            end += 1
+        if end == start:
+            continue
+        indices = {start, end - 1}
+        finite = [k for k in range(start, end) if _finite(ys[k])]
+        if finite:
+            indices.add(min(finite, key=ys.__getitem__))
+            indices.add(max(finite, key=ys.__getitem__))
+        if len(finite) != end - start:
+            # Keep gaps visible
+            indices.update(k for k in range(start, end) if not _finite(ys[k]))
+        for k in sorted(indices):
+            out_xs.append(xs[k])
+            out_ys.append(ys[k])
+        start = end
+    return out_xs, out_ys
+
+
+class SeriesCache:
+    # LRU of sampled series keyed on (expression, degrees, range)
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, expression, degrees, x_min, x_max, samples=DEFAULT_SAMPLES):
+        key = (expression, degrees, x_min, x_max, samples)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        compiled = compile_expression(expression, ('x',), degrees)
+        series = adaptive_sample(compiled, x_min, x_max, samples)
+        self._entries[key] = series
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return series
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PlotSeries:
+    # Sampled points for one expression. Panning only samples the interval
+    # that scrolls into view; zooming far enough to change the required
+    # density resamples the visible range.
+    def __init__(self, expression, degrees=False, cache=None):
+        self.expression = expression
+        self.degrees = degrees
+        self.cache = cache if cache is not None else SeriesCache()
+        self.compiled = compile_expression(expression, ('x',), degrees)
+        self.xs = []
+        self.ys = []
+        self.density = 0.0
+
+    def sample(self, x_min, x_max):
+        view_width = x_max - x_min
+        target_density = DEFAULT_SAMPLES / view_width
+        covered = bool(self.xs) and x_max > self.xs[0] and x_min < self.xs[-1]
+        if (not covered or self.density < target_density / 2
+                or self.density > target_density * 8):
+            self.xs, self.ys = self.cache.get(self.expression, self.degrees, x_min, x_max)
+            self.xs, self.ys = list(self.xs), list(self.ys)
+            self.density = target_density
+        else:
+            self._extend(x_min, x_max)
+        lo = bisect.bisect_left(self.xs, x_min)
+        hi = bisect.bisect_right(self.xs, x_max)
+        # Include one point either side so lines reach the edges
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(self.xs))
+        return self.xs[lo:hi], self.ys[lo:hi]
+
+    def _extend(self, x_min, x_max):
+        if x_min < self.xs[0]:
+            xs, ys = self._sample_interval(x_min, self.xs[0])
+            self.xs = xs[:-1] + self.xs
+            self.ys = ys[:-1] + self.ys
+        if x_max > self.xs[-1]:
+            xs, ys = self._sample_interval(self.xs[-1], x_max)
+            self.xs = self.xs + xs[1:]
+            self.ys = self.ys + ys[1:]
+        if len(self.xs) > MAX_POINTS:
+            # Drop the points furthest from the current view
+            lo = bisect.bisect_left(self.xs, x_min)
+            hi = bisect.bisect_right(self.xs, x_max)
+            margin = max((MAX_POINTS - (hi - lo)) // 2, 0)
+            lo, hi = max(lo - margin, 0), hi + margin
+            self.xs, self.ys = self.xs[lo:hi], self.ys[lo:hi]
+
+    def _sample_interval(self, x_min, x_max):
+        samples = max(int(math.ceil((x_max - x_min) * self.density)) + 1, 3)
+        return adaptive_sample(self.compiled, x_min, x_max, samples)
@@ -0,0 +1,100 @@
+import base64
+import os
+import threading
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QStandardPaths, Qt
+from PyQt5.QtGui import QColor, QFont, QIcon, QPainter, QPixmap
+
+APP_NAME = 'AllInOneCalculator'
+ICON_SIZE = 32
+
+# PNG icons embedded in the module, so the app never has to create or find
+# files next to the working directory. Sources live in resources/.
+EMBEDDED_ICONS = {
+    'copy': (
+        'iVBORw0KGgoAAAANSUhEUgAAACAAAAAgCAIAAAD8GO2jAAAAVUlEQVR4nGP8//8/Ay0BE01NH7Vg1IJRC+hjAQse'
+        'OUZGRjib7BIFpw8gplNeUuHzAQRQaMcgiGRGRkbkyKCaBZCQoTwmGEcrnFELRi0YtWDUgqFgAQBslBU9jAQVAgAA'
+        'AABJRU5ErkJggg=='
+    ),
+    'export': (
+        'iVBORw0KGgoAAAANSUhEUgAAACAAAAAgCAIAAAD8GO2jAAAAVElEQVR4nGP8//8/Ay0BE01NH7Vg1IJRC+hjAQsu'
+        'CUZGRmQu2SUKTgsoNBcOCAQRIyMjmldIBQPtAwaKPUE4iMg2GmrCaIUzasGoBaMWjFowFCwAAPeND0hwb5gtAAAA'
+        'AElFTkSuQmCC'
+    ),
+}
+
+_icons = {}
+
+
+def cache_dir():
+    # Per-user cache location; only created when something is written to it
+    location = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    return location or os.path.join(os.path.expanduser('~'), '.cache', APP_NAME)
+
+
+def load_cached_asset(name):
+    try:
+        with open(os.path.join(cache_dir(), name), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_cached_asset(name, data):
+    # Written from a background thread so callers never wait on the disk;
+    # a read-only or missing home directory just means no disk cache
+    def write():
+        try:
+            directory = cache_dir()
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Resource cache write error: {str(e)}")
+
+    threading.Thread(target=write, daemon=True).start()
+
+
+def render_letter_icon(letter):
+    pixmap = QPixmap(ICON_SIZE, ICON_SIZE)
+    pixmap.fill(QColor('white'))
+    painter = QPainter(pixmap)
+    painter.setPen(QColor('black'))
+    painter.setFont(QFont('Arial', 14))
+    painter.drawText(pixmap.rect(), Qt.AlignCenter, letter)
+    painter.end()
+    return pixmap
+
+
+def _png_bytes(pixmap):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    pixmap.save(buffer, 'PNG')
+    buffer.close()
+    return bytes(data)
+
+
+def _pixmap_from_bytes(data):
+    pixmap = QPixmap()
+    pixmap.loadFromData(data, 'PNG')
+    return pixmap
+
+
+def icon(name):
+    # Embedded icons first, then the per-user cache, then a generated
+    # letter icon that is cached for the next launch
+    if name in _icons:
+        return _icons[name]
+    if name in EMBEDDED_ICONS:
+        pixmap = _pixmap_from_bytes(base64.b64decode(EMBEDDED_ICONS[name]))
+    else:
+        filename = f'icon_{name}.png'
+        data = load_cached_asset(filename)
+        if data is not None:
+            pixmap = _pixmap_from_bytes(data)
+        else:
+            pixmap = render_letter_icon(name[:1].upper())
+            save_cached_asset(filename, _png_bytes(pixmap))
+    _icons[name] = QIcon(pixmap)
+    return _icons[name]
@@ -0,0 +1,169 @@
+import ast
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from evaluator import evaluate as evaluate_expression, normalize
+
+LOCAL_CACHE_SIZE = 4096
+SHARED_CACHE_TTL = 24 * 60 * 60
+KEY_PREFIX = 'calc:'
+
+
+def cache_key(expression):
+    # Expressions that parse to the same tree share one entry, so "2 + 2",
+    # "2+2" and " 2+ 2 " do while "1e - 3" (invalid) and "1e-3" do not.
+    # Text that does not parse only shares an entry with identical text.
+    try:
+        key = 'ast:' + ast.dump(ast.parse(normalize(expression), mode='eval'))
+    except (SyntaxError, ValueError, RecursionError):
+        key = 'raw:' + expression
+    # Fixed-length keys for the shared backend
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, maxsize=LOCAL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class InMemoryClient:
+    # Stand-in for a shared cache server; speaks the small subset of the
+    # redis-py client API that SharedCache uses
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._data.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+
+class SharedCache:
+    def __init__(self, client, ttl=SHARED_CACHE_TTL, prefix=KEY_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+
+class ResultCache:
+    # In-process LRU in front of an optional shared backend. Shared backend
+    # failures are treated as misses so a cache outage never fails a request.
+    def __init__(self, local_size=LOCAL_CACHE_SIZE, backend=None):
+        self.local = LRUCache(local_size)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, expression):
+        key = cache_key(expression)
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                print(f"Shared cache error: {str(e)}")
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, expression, value):
+        key = cache_key(expression)
+        self.local.set(key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                print(f"Shared cache error: {str(e)}")
+
+
+def create_cache(redis_url=None, local_size=LOCAL_CACHE_SIZE):
+    # 'memory://' selects the in-process stand-in for the shared backend
+    if not redis_url:
+        return ResultCache(local_size)
+    if redis_url == 'memory://':
+        return ResultCache(local_size, SharedCache(InMemoryClient()))
+    try:
+        import redis
+    except ImportError:
+        print("redis is not installed; using the in-process result cache only")
+        return ResultCache(local_size)
+    return ResultCache(local_size, SharedCache(redis.Redis.from_url(redis_url)))
+
+
+def json_safe(payload):
+    try:
+        # e.g. integers past the digit limit of str() cannot be sent, and
+        # values JSON has no type for raise TypeError
+        json.dumps(payload)
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}
+    try:
+        # inf and nan would be written as Infinity/NaN, which is not JSON
+        json.dumps(payload, allow_nan=False)
+    except ValueError:
+        return {'error': 'Result is not a finite number'}
+    return payload
+
+
+def evaluate_cached(cache, expression, degrees=False):
+    # The /calculate payload: {'result': ...} or {'error': ...}. The key
+    # does not include `degrees`, so use one cache per angle mode.
+    if not isinstance(expression, str):
+        return {'error': 'expression must be a string'}
+    payload = cache.get(expression)
+    if payload is None:
+        # Same grammar as the calculator pages and static/calculator.js
+        try:
+            payload = {'result': evaluate_expression(expression, degrees)}
+        except Exception as e:
+            payload = {'error': str(e)}
+        else:
+            payload = json_safe(payload)
+        cache.set(expression, payload)
+    return payload
@@ -0,0 +1,157 @@
+import bisect
+import csv
+import json
+import os
+import sys
+
+MEASUREMENTS = ('chest', 'waist', 'height', 'weight')
+DEFAULT_CHART_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'resources', 'size_chart.json')
+
+
+def _unique(values):
+    # Keep the order the charts appear in the file
+    return list(dict.fromkeys(values))
+
+
+class SizeChart:
+    def __init__(self, region, brand, garment, gender, sizes, limits):
+        self.region = region
+        self.brand = brand
+        self.garment = garment
+        self.gender = gender
+        self.sizes = list(sizes)
+        # Interval index: for every measurement, the sorted exclusive upper
+        # bound of each size except the last, which is open-ended
+        self.limits = {}
+        for name, bounds in limits.items():
+            if name not in MEASUREMENTS:
+                raise ValueError(f'Unknown measurement in size chart: {name}')
+            if len(bounds) != len(self.sizes) - 1 or list(bounds) != sorted(bounds):
+                raise ValueError(f'Invalid {name} limits for {garment} ({gender})')
+            self.limits[name] = [float(b) for b in bounds]
+
+    def size_index(self, measurements):
+        # A size fits when every measurement is below its upper bound, so the
+        # recommendation is the largest interval any measurement falls into
+        index = None
+        for name, bounds in self.limits.items():
+            value = measurements.get(name)
+            if value is None:
+                continue
+            position = bisect.bisect_right(bounds, value)
+            if index is None or position > index:
+                index = position
+        if index is None:
+            raise ValueError('No measurements given for this size chart')
+        return index
+
+    def recommend(self, measurements):
+        return self.sizes[self.size_index(measurements)]
+
+    def describe(self):
+        lines = [f'{self.gender}:']
+        for i, size in enumerate(self.sizes):
+            parts = []
+            for name, bounds in self.limits.items():
+                if i < len(bounds):
+                    parts.append(f'{name.capitalize()} < {bounds[i]:g}')
+                else:
+                    parts.append(f'{name.capitalize()} >= {bounds[-1]:g}')
+            lines.append(f'{size}: ' + ', '.join(parts))
+        return '\n'.join(lines)
+
+
+class SizeGuide:
+    def __init__(self, charts, units=None):
+        self.units = units or {}
+        self.charts = {}
+        for chart in charts:
+            key = (chart.region, chart.brand, chart.garment, chart.gender)
+            self.charts[key] = chart
+
+    @classmethod
+    def load(cls, path=DEFAULT_CHART_PATH):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        charts = [
+            SizeChart(c['region'], c['brand'], c['garment'], c['gender'], c['sizes'], c['limits'])
+            for c in data['charts']
+        ]
+        return cls(charts, data.get('units'))
+
+    def regions(self):
+        return _unique(key[0] for key in self.charts)
+
+    def brands(self, region):
+        return _unique(key[1] for key in self.charts if key[0] == region)
+
+    def garments(self, region, brand):
+        return _unique(key[2] for key in self.charts if key[:2] == (region, brand))
+
+    def genders(self, region, brand, garment):
+        return _unique(key[3] for key in self.charts if key[:3] == (region, brand, garment))
+
+    def chart(self, region, brand, garment, gender):
+        try:
+            return self.charts[(region, brand, garment, gender)]
+        except KeyError:
+            raise ValueError(f'No size chart for {region}/{brand}/{garment}/{gender}')
+
+    def recommend(self, region, brand, garment, gender, **measurements):
+        return self.chart(region, brand, garment, gender).recommend(measurements)
+
+    def describe(self, region, brand, garment):
+        unit_text = ', '.join(f'{name} in {unit}' for name, unit in self.units.items())
+        sections = [f'Size Chart: {region} / {brand} / {garment}']
+        if unit_text:
+            sections.append(f'({unit_text})')
+        for gender in self.genders(region, brand, garment):
+            sections.append(self.chart(region, brand, garment, gender).describe())
+        return '\n\n'.join(sections)
+
+
+def _parse_measurement(value):
+    value = (value or '').strip()
+    return float(value) if value else None
+
+
+def score_csv(guide, input_file, output_file, region, brand, garment):
+    # Stream customers through the interval index. Rows may override the
+    # region, brand and garment columns; rows that cannot be scored get an
+    # error column instead of stopping the batch.
+    reader = csv.DictReader(input_file)
+    fieldnames = list(reader.fieldnames or []) + ['size', 'error']
+    writer = csv.DictWriter(output_file, fieldnames=fieldnames)
+    writer.writeheader()
+    count = 0
+    for row in reader:
+        try:
+            measurements = {name: _parse_measurement(row.get(name)) for name in MEASUREMENTS}
+            chart = guide.chart(row.get('region') or region, row.get('brand') or brand,
+                                row.get('garment') or garment, (row.get('gender') or '').capitalize())
+            row['size'] = chart.recommend(measurements)
+            row['error'] = ''
+        except ValueError as e:
+            row['size'] = ''
+            row['error'] = str(e)
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python size_guide.py customers.csv [output.csv] [region] [brand] [garment]')
+        sys.exit(1)
+    args = sys.argv[1:] + [None] * 5
+    input_path, output_path = args[0], args[1]
+    region, brand, garment = args[2] or 'International', args[3] or 'Generic', args[4] or 'Tops'
+    guide = SizeGuide.load()
+    with open(input_path, newline='', encoding='utf-8') as src:
+        if output_path:
+            with open(output_path, 'w', newline='', encoding='utf-8') as dst:
+                count = score_csv(guide, src, dst, region, brand, garment)
+        else:
+            count = score_csv(guide, src, sys.stdout, region, brand, garment)
+    print(f'Scored {count} customers.', file=sys.stderr)
@@ -0,0 +1,246 @@
+// Client-side evaluator for the calculator grammar used by evaluator.py on
+// the server: + - * / // % ** ^, unary signs, n!, parentheses, the
+// functions below and the constants pi/π, e and phi. Anything the client
+// cannot reproduce exactly (integers beyond 2^53, non-finite results,
+// multi-argument calls, unknown syntax) is sent to the server instead, so
+// both paths always agree.
+
+const Calc = (function () {
+    const PHI = 1.618033988749895;
+    const CONSTANTS = { pi: Math.PI, 'π': Math.PI, e: Math.E, phi: PHI };
+    const FUNCTIONS = {
+        sin: Math.sin, cos: Math.cos, tan: Math.tan,
+        sinh: Math.sinh, cosh: Math.cosh, tanh: Math.tanh,
+        log: Math.log10, ln: Math.log, sqrt: Math.sqrt, exp: Math.exp,
+    };
+    const TOKEN = /\s*(?:(\d+\.\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+)|(\d+)|([A-Za-zπ_]\w*)|(\*\*|\/\/|[-+*\/%^()!×÷]))/y;
+
+    class NeedsServer extends Error {}
+
+    // Values carry Python's int/float distinction so integer overflow past
+    // 2^53 can be detected and handed to the server's big integers
+    function num(value, isInt) {
+        if (!Number.isFinite(value)) throw new NeedsServer('non-finite');
+        if (isInt && !Number.isSafeInteger(value)) throw new NeedsServer('big integer');
+        return { value, isInt };
+    }
+
+    // Python's divmod (CPython's float_divmod). The remainder takes the sign
+    // of the divisor and is only adjusted when the signs differ, which keeps
+    // small remainders exact; the quotient comes from the exact remainder
+    // rather than from flooring the rounded a / b, so 1 // 0.1 is 9 as in
+    // Python, not 10.
+    function pyDivmod(a, b) {
+        let mod = a % b;
+        let div = (a - mod) / b;
+        if (mod !== 0 && (mod < 0) !== (b < 0)) {
+            mod += b;
+            div -= 1;
+        }
+        let floordiv = Math.floor(div);
+        if (div - floordiv > 0.5) floordiv += 1;
+        return [floordiv, mod];
+    }
+
+    function tokenize(text) {
+        const tokens = [];
+        TOKEN.lastIndex = 0;
+        text = text.trim();
+        while (TOKEN.lastIndex < text.length) {
+            const start = TOKEN.lastIndex;
+            const m = TOKEN.exec(text);
+            if (!m || TOKEN.lastIndex === start) throw new NeedsServer('token');
+            if (m[1] !== undefined) tokens.push({ kind: 'float', text: m[1] });
+            else if (m[2] !== undefined) {
+                // Python rejects 007 (but not 0 or 000); let the server say so
+                if (/^0+[1-9]/.test(m[2])) throw new NeedsServer('leading zero');
+                tokens.push({ kind: 'int', text: m[2] });
+            }
+            else if (m[3] !== undefined) tokens.push({ kind: 'name', text: m[3] });
+            else {
+                const op = { '^': '**', '×': '*', '÷': '/' }[m[4]] || m[4];
+                tokens.push({ kind: 'op', text: op });
+            }
+        }
+        return tokens;
+    }
+
+    function parse(tokens) {
+        let pos = 0;
+        const peek = (text) => pos < tokens.length && tokens[pos].kind === 'op' && tokens[pos].text === text;
+        const expect = (text) => {
+            if (!peek(text)) throw new NeedsServer('syntax');
+            pos++;
+        };
+
+        function expr() {
+            let left = term();
+            while (peek('+') || peek('-')) {
+                const op = tokens[pos++].text;
+                const right = term();
+                left = op === '+'
+                    ? num(left.value + right.value, left.isInt && right.isInt)
+                    : num(left.value - right.value, left.isInt && right.isInt);
+            }
+            return left;
+        }
+
+        function term() {
+            let left = unary();
+            while (peek('*') || peek('/') || peek('//') || peek('%')) {
+                const op = tokens[pos++].text;
+                const right = unary();
+                const isInt = left.isInt && right.isInt;
+                if (op === '*') {
+                    left = num(left.value * right.value, isInt);
+                } else {
+                    if (right.value === 0) throw new NeedsServer('division by zero');
+                    if (op === '/') left = num(left.value / right.value, false);
+                    else left = num(pyDivmod(left.value, right.value)[op === '//' ? 0 : 1], isInt);
+                }
+            }
+            return left;
+        }
+
+        function unary() {
+            if (peek('-')) {
+                pos++;
+                const operand = unary();
+                return num(-operand.value, operand.isInt);
+            }
+            if (peek('+')) {
+                pos++;
+                return unary();
+            }
+            return power();
+        }
+
+        // Python binds ** tighter than a unary sign on its left: -2**2 == -4
+        function power() {
+            const base = postfix();
+            if (!peek('**')) return base;
+            pos++;
+            const exponent = unary();
+            if (base.value === 0 && exponent.value < 0) throw new NeedsServer('division by zero');
+            if (base.value < 0 && !Number.isInteger(exponent.value)) throw new NeedsServer('complex');
+            if (base.isInt && exponent.isInt && exponent.value >= 0) {
+                // Square-and-multiply keeps integer powers exact
+                let result = 1, factor = base.value, remaining = exponent.value;
+                while (remaining > 0) {
+                    if (remaining % 2 === 1) result = num(result * factor, true).value;
+                    remaining = Math.floor(remaining / 2);
+                    if (remaining > 0) factor = num(factor * factor, true).value;
+                }
+                return num(result, true);
+            }
+            return num(Math.pow(base.value, exponent.value), false);
+        }
+
+        // The server only rewrites n! directly after a literal
+        function postfix() {
+            const token = tokens[pos];
+            const value = atom();
+            if (!peek('!')) return value;
+            pos++;
+            if (!token || token.kind !== 'int') throw new NeedsServer('factorial');
+            let result = 1;
+            for (let i = 2; i <= value.value; i++) result = num(result * i, true).value;
+            return num(result, true);
+        }
+
+        function atom() {
+            if (pos >= tokens.length) throw new NeedsServer('syntax');
+            const token = tokens[pos++];
+            if (token.kind === 'int') return num(parseInt(token.text, 10), true);
+            if (token.kind === 'float') return num(parseFloat(token.text), false);
+            if (token.kind === 'op' && token.text === '(') {
+                const inner = expr();
+                expect(')');
+                return inner;
+            }
+            if (token.kind === 'name') {
+                if (peek('(')) {
+                    pos++;
+                    const arg = expr();
+                    expect(')');
+                    if (token.text === 'abs') return num(Math.abs(arg.value), arg.isInt);
+                    const fn = FUNCTIONS[token.text];
+                    if (!fn) throw new NeedsServer('function');
+                    return num(fn(arg.value), false);
+                }
+                if (token.text in CONSTANTS) return num(CONSTANTS[token.text], false);
+            }
+            throw new NeedsServer('syntax');
+        }
+
+        const result = expr();
+        if (pos !== tokens.length) throw new NeedsServer('syntax');
+        return result;
+    }
+
+    // Returns the result, or undefined when the server has to evaluate it
+    function evaluateLocally(expression) {
+        try {
+            return parse(tokenize(expression)).value;
+        } catch (e) {
+            if (e instanceof NeedsServer) return undefined;
+            throw e;
+        }
+    }
+
+    return { evaluateLocally };
+})();
+
+// Results computed locally are buffered and synced to the server in batches
+const HistorySync = (function () {
+    const BATCH_SIZE = 20;
+    const FLUSH_INTERVAL = 10000;
+    let pending = [];
+
+    function id(storage, key) {
+        let value = storage.getItem(key);
+        if (!value) {
+            value = Math.random().toString(36).slice(2) + Date.now().toString(36);
+            storage.setItem(key, value);
+        }
+        return value;
+    }
+
+    const userId = id(localStorage, 'calculator_user_id');
+    const sessionId = id(sessionStorage, 'calculator_session_id');
+
+    function record(expression, result) {
+        pending.push({ expression, result: String(result), type: 'simple' });
+        if (pending.length >= BATCH_SIZE) flush();
+    }
+
+    function flush(useBeacon) {
+        if (pending.length === 0) return;
+        const body = JSON.stringify({ user_id: userId, session_id: sessionId, entries: pending });
+        const batch = pending;
+        pending = [];
+        if (useBeacon && navigator.sendBeacon) {
+            navigator.sendBeacon('/history/batch', new Blob([body], { type: 'application/json' }));
+            return;
+        }
+        fetch('/history/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body,
+        }).then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+        }).catch(error => {
+            // Keep the entries for the next attempt
+            pending = batch.concat(pending);
+            console.error('History sync failed:', error);
+        });
+    }
+
+    setInterval(flush, FLUSH_INTERVAL);
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') flush(true);
+    });
+    window.addEventListener('pagehide', () => flush(true));
+
+    return { record, flush, userId, sessionId };
+})();
@@ -0,0 +1,147 @@
+import json
+import queue
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from result_cache import json_safe
+
+# Per-connection limits: at most MAX_PENDING expressions submitted but not
+# yet sent to the client, and a token bucket refilled at RATE_LIMIT
+# expressions per second up to BURST
+MAX_PENDING = 1000
+RATE_LIMIT = 200.0
+BURST = 500
+MAX_BATCH = 500
+MAX_EVENT_RESULTS = 100
+KEEPALIVE_INTERVAL = 15.0
+WORKERS = 4
+
+
+class StreamError(Exception):
+    status = 400
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Backpressure(StreamError):
+    status = 429
+
+
+class RateLimited(StreamError):
+    status = 429
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        # Returns 0 on success, otherwise the seconds until enough tokens exist
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if amount > self.capacity:
+                return float('inf')
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+
+class Channel:
+    def __init__(self, channel_id, max_pending, rate, burst):
+        self.id = channel_id
+        self.max_pending = max_pending
+        self.bucket = TokenBucket(rate, burst)
+        self.results = queue.Queue()
+        self.pending = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def submit(self, items, executor, evaluate):
+        # A batch larger than the bucket could never be admitted, so it is a
+        # client error rather than a rate limit to retry
+        limit = min(MAX_BATCH, self.bucket.capacity)
+        if len(items) > limit:
+            raise StreamError(f'At most {limit} expressions per request')
+        with self._lock:
+            if self.pending + len(items) > self.max_pending:
+                raise Backpressure(f'Channel is full ({self.pending} of {self.max_pending} pending)',
+                                   retry_after=1)
+            wait = self.bucket.consume(len(items))
+            if wait:
+                raise RateLimited('Rate limit exceeded', retry_after=max(1, round(wait)))
+            self.pending += len(items)
+        for item in items:
+            executor.submit(self._run, item, evaluate)
+        return len(items)
+
+    def _run(self, item, evaluate):
+        try:
+            message = {'id': item.get('id'), **json_safe(evaluate(item.get('expression')))}
+        except Exception as e:
+            message = {'id': item.get('id'), 'error': str(e)}
+        self.results.put(message)
+
+    def events(self):
+        # Server-Sent Events: results are sent as they finish, several per
+        # event when they pile up, with comments as keep-alives
+        yield f'event: channel\ndata: {json.dumps({"channel": self.id})}\n\n'
+        while not self.closed:
+            try:
+                batch = [self.results.get(timeout=KEEPALIVE_INTERVAL)]
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            while len(batch) < MAX_EVENT_RESULTS:
+                try:
+                    batch.append(self.results.get_nowait())
+                except queue.Empty:
+                    break
+            yield f'data: {json.dumps(batch)}\n\n'
+            # Results count as pending until they are sent, so a slow reader
+            # gets backpressure instead of an ever-growing queue
+            with self._lock:
+                self.pending -= len(batch)
+
+
+class ChannelRegistry:
+    def __init__(self, max_pending=MAX_PENDING, rate=RATE_LIMIT, burst=BURST, workers=WORKERS):
+        self.max_pending = max_pending
+        self.rate = rate
+        self.burst = burst
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stream')
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def open(self):
+        channel = Channel(secrets.token_urlsafe(16), self.max_pending, self.rate, self.burst)
+        with self._lock:
+            self._channels[channel.id] = channel
+        return channel
+
+    def get(self, channel_id):
+        with self._lock:
+            return self._channels.get(channel_id)
+
+    def close(self, channel_id):
+        with self._lock:
+            channel = self._channels.pop(channel_id, None)
+        if channel is not None:
+            channel.closed = True
+
+    def stream(self, channel):
+        try:
+            yield from channel.events()
+        finally:
+            # The client went away
+            self.close(channel.id)
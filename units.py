@@ -0,0 +1,327 @@
+import re
+from functools import lru_cache
+
+# Base dimensions; a unit's dimension is a vector of exponents over these
+DIMENSIONS = ('length', 'mass', 'time', 'temperature', 'amount', 'current', 'luminosity')
+DIMENSIONLESS = (0,) * len(DIMENSIONS)
+
+
+def _dims(**exponents):
+    return tuple(exponents.get(name, 0) for name in DIMENSIONS)
+
+
+LENGTH = _dims(length=1)
+MASS = _dims(mass=1)
+TIME = _dims(time=1)
+TEMPERATURE = _dims(temperature=1)
+AREA = _dims(length=2)
+VOLUME = _dims(length=3)
+SPEED = _dims(length=1, time=-1)
+FORCE = _dims(mass=1, length=1, time=-2)
+ENERGY = _dims(mass=1, length=2, time=-2)
+POWER = _dims(mass=1, length=2, time=-3)
+PRESSURE = _dims(mass=1, length=-1, time=-2)
+
+SI_PREFIXES = {
+    'Y': 1e24, 'Z': 1e21, 'E': 1e18, 'P': 1e15, 'T': 1e12, 'G': 1e9, 'M': 1e6,
+    'k': 1e3, 'h': 1e2, 'da': 1e1, 'd': 1e-1, 'c': 1e-2, 'm': 1e-3,
+    'µ': 1e-6, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12, 'f': 1e-15,
+}
+
+# name: (factor to SI base, dimension, offset, accepts SI prefixes)
+UNITS = {
+    'm': (1.0, LENGTH, 0.0, True),
+    'in': (0.0254, LENGTH, 0.0, False),
+    'ft': (0.3048, LENGTH, 0.0, False),
+    'yd': (0.9144, LENGTH, 0.0, False),
+    'mi': (1609.344, LENGTH, 0.0, False),
+    'nmi': (1852.0, LENGTH, 0.0, False),
+    'g': (1e-3, MASS, 0.0, True),
+    't': (1000.0, MASS, 0.0, False),
+    'lb': (0.45359237, MASS, 0.0, False),
+    'oz': (0.028349523125, MASS, 0.0, False),
+    'st': (6.35029318, MASS, 0.0, False),
+    's': (1.0, TIME, 0.0, True),
+    'min': (60.0, TIME, 0.0, False),
+    'h': (3600.0, TIME, 0.0, False),
+    'day': (86400.0, TIME, 0.0, False),
+    'week': (604800.0, TIME, 0.0, False),
+    'l': (1e-3, VOLUME, 0.0, True),
+    'L': (1e-3, VOLUME, 0.0, True),
+    'gal': (3.785411784e-3, VOLUME, 0.0, False),
+    'qt': (9.46352946e-4, VOLUME, 0.0, False),
+    'pt': (4.73176473e-4, VOLUME, 0.0, False),
+    'cup': (2.365882365e-4, VOLUME, 0.0, False),
+    'floz': (2.95735295625e-5, VOLUME, 0.0, False),
+    'ha': (1e4, AREA, 0.0, False),
+    'acre': (4046.8564224, AREA, 0.0, False),
+    'kph': (1 / 3.6, SPEED, 0.0, False),
+    'mph': (0.44704, SPEED, 0.0, False),
+    'kn': (1852.0 / 3600.0, SPEED, 0.0, False),
+    'N': (1.0, FORCE, 0.0, True),
+    'J': (1.0, ENERGY, 0.0, True),
+    'cal': (4.184, ENERGY, 0.0, True),
+    'Wh': (3600.0, ENERGY, 0.0, True),
+    'W': (1.0, POWER, 0.0, True),
+    'hp': (745.69987158227022, POWER, 0.0, False),
+    'Pa': (1.0, PRESSURE, 0.0, True),
+    'bar': (1e5, PRESSURE, 0.0, True),
+    'atm': (101325.0, PRESSURE, 0.0, False),
+    'psi': (6894.757293168, PRESSURE, 0.0, False),
+    'Hz': (1.0, _dims(time=-1), 0.0, True),
+    'mol': (1.0, _dims(amount=1), 0.0, True),
+    'A': (1.0, _dims(current=1), 0.0, True),
+    'cd': (1.0, _dims(luminosity=1), 0.0, True),
+    # Temperatures carry an offset, so they only convert on their own
+    'K': (1.0, TEMPERATURE, 0.0, True),
+    'C': (1.0, TEMPERATURE, 273.15, False),
+    'F': (5 / 9, TEMPERATURE, 273.15 - 32 * 5 / 9, False),
+}
+ALIASES = {'°C': 'C', '°F': 'F', 'degC': 'C', 'degF': 'F', 'sec': 's', 'hr': 'h', 'd': 'day'}
+
+# The converter page categories, each extended with extra units
+CATEGORIES = {
+    'Length': ['cm', 'm', 'km', 'in', 'ft', 'mm', 'yd', 'mi', 'nmi'],
+    'Weight': ['g', 'kg', 'lb', 'oz', 'mg', 't', 'st'],
+    'Volume': ['ml', 'l', 'gal', 'cl', 'qt', 'pt', 'cup', 'floz'],
+    'Temperature': ['C', 'F', 'K'],
+    'Area': ['m^2', 'cm^2', 'km^2', 'ft^2', 'in^2', 'ha', 'acre'],
+    'Speed': ['m/s', 'km/h', 'mi/h', 'ft/s', 'kn'],
+    'Time': ['s', 'ms', 'min', 'h', 'day', 'week'],
+    'Energy': ['J', 'kJ', 'cal', 'kcal', 'Wh', 'kWh'],
+    'Pressure': ['Pa', 'kPa', 'bar', 'atm', 'psi'],
+}
+
+CONVERSION_KEYWORDS = re.compile(r'(?=(\s(?:to|in|as)\s|->))')
+TOKEN = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)'
+                   r'|(?P<name>°?[A-Za-zµ]+)|(?P<op>[-+*/^()·]))')
+
+
+class UnitError(ValueError):
+    pass
+
+
+class Unit:
+    def __init__(self, factor, dims, offset=0.0):
+        self.factor = factor
+        self.dims = dims
+        self.offset = offset
+
+    def __mul__(self, other):
+        self._require_linear(other)
+        return Unit(self.factor * other.factor, tuple(a + b for a, b in zip(self.dims, other.dims)))
+
+    def __truediv__(self, other):
+        self._require_linear(other)
+        return Unit(self.factor / other.factor, tuple(a - b for a, b in zip(self.dims, other.dims)))
+
+    def __pow__(self, power):
+        self._require_linear()
+        return Unit(self.factor ** power, tuple(d * power for d in self.dims))
+
+    def _require_linear(self, other=None):
+        if self.offset or (other is not None and other.offset):
+            raise UnitError('Temperature units cannot be combined with other units')
+
+    def to_base(self, value):
+        return value * self.factor + self.offset
+
+    def from_base(self, value):
+        return (value - self.offset) / self.factor
+
+
+def describe_dimension(dims):
+    parts = [name if power == 1 else f'{name}^{power}'
+             for name, power in zip(DIMENSIONS, dims) if power]
+    return '·'.join(parts) or 'dimensionless'
+
+
+def _tokenize(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise UnitError(f'Unexpected character: {text[pos:].strip()[:1]}')
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+@lru_cache(maxsize=1024)
+def lookup_unit(name):
+    name = ALIASES.get(name, name)
+    if name in UNITS:
+        factor, dims, offset, _ = UNITS[name]
+        return Unit(factor, dims, offset)
+    # SI prefix expansion, longest prefix first ('da' before 'd')
+    for prefix in sorted(SI_PREFIXES, key=len, reverse=True):
+        if name.startswith(prefix) and name[len(prefix):] in UNITS:
+            factor, dims, offset, prefixable = UNITS[name[len(prefix):]]
+            if prefixable:
+                return Unit(factor * SI_PREFIXES[prefix], dims, offset)
+    raise UnitError(f'Unknown unit: {name}')
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if (kind and token[0] != kind) or (value and token[1] != value):
+            return None
+        return token
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    # unit := factor (('*' | '/' | '·' | <juxtaposition>) factor)*
+    def unit(self):
+        unit = self.unit_factor()
+        while True:
+            if self.peek('op', '*') or self.peek('op', '·'):
+                self.take()
+                unit = unit * self.unit_factor()
+            elif self.peek('op', '/'):
+                self.take()
+                unit = unit / self.unit_factor()
+            elif self.peek('name') or self.peek('op', '('):
+                unit = unit * self.unit_factor()
+            else:
+                return unit
+
+    # factor := (name | '(' unit ')') ('^' ['-'] number)?
+    def unit_factor(self):
+        if self.peek('op', '('):
+            self.take()
+            unit = self.unit()
+            if not self.peek('op', ')'):
+                raise UnitError('Missing closing parenthesis')
+            self.take()
+        elif self.peek('name'):
+            unit = lookup_unit(self.take()[1])
+        else:
+            raise UnitError('Expected a unit')
+        if self.peek('op', '^'):
+            self.take()
+            sign = 1
+            if self.peek('op', '-'):
+                self.take()
+                sign = -1
+            if not self.peek('number'):
+                raise UnitError('Expected an exponent')
+            power = float(self.take()[1]) * sign
+            unit = unit ** (int(power) if power.is_integer() else power)
+        return unit
+
+    # quantity := term (('+' | '-') term)*
+    # term := (number unit?)+, adjacent pairs add up as in "3 ft 4 in"
+    def quantity(self):
+        value, unit = self.term()
+        while self.peek('op', '+') or self.peek('op', '-'):
+            sign = 1 if self.take()[1] == '+' else -1
+            term_value, term_unit = self.term()
+            value, unit = _add(value, unit, sign * term_value, term_unit)
+        return value, unit
+
+    def term(self):
+        sign = 1
+        if self.peek('op', '-'):
+            self.take()
+            sign = -1
+        value, unit = None, None
+        while self.peek('number'):
+            number = float(self.take()[1])
+            pair_unit = self.unit() if (self.peek('name') or self.peek('op', '(')) else None
+            if value is None:
+                value, unit = number, pair_unit
+            else:
+                value, unit = _add(value, unit, number, pair_unit)
+        if value is None:
+            raise UnitError('Expected a number')
+        return sign * value, unit
+
+
+def _add(value, unit, other_value, other_unit):
+    # Sums are carried in the unit of the left-hand side
+    if unit is None or other_unit is None:
+        if unit is not other_unit:
+            raise UnitError('Cannot add a plain number to a quantity with units')
+        return value + other_value, None
+    if unit.dims != other_unit.dims:
+        raise UnitError(f'Cannot add {describe_dimension(unit.dims)} '
+                        f'and {describe_dimension(other_unit.dims)}')
+    if unit.offset or other_unit.offset:
+        raise UnitError('Temperature units cannot be added')
+    return value + other_value * other_unit.factor / unit.factor, unit
+
+
+@lru_cache(maxsize=1024)
+def parse_unit(text):
+    parser = _Parser(_tokenize(text))
+    unit = parser.unit()
+    if not parser.done():
+        raise UnitError(f'Invalid unit: {text}')
+    return unit
+
+
+@lru_cache(maxsize=1024)
+def conversion(from_unit, to_unit):
+    # Returns (factor, offset) so that target = value * factor + offset
+    source, target = parse_unit(from_unit), parse_unit(to_unit)
+    if source.dims != target.dims:
+        raise UnitError(f'Cannot convert {describe_dimension(source.dims)} '
+                        f'to {describe_dimension(target.dims)}')
+    factor = source.factor / target.factor
+    offset = (source.offset - target.offset) / target.factor
+    return factor, offset
+
+
+def convert(value, from_unit, to_unit):
+    factor, offset = conversion(from_unit, to_unit)
+    return value * factor + offset
+
+
+def _split_conversion(text):
+    # "3 ft 4 in + 12 cm in m": the keyword is ambiguous with the inch, so try
+    # splitting at the right-most keyword whose right side is a valid unit
+    for match in reversed(list(CONVERSION_KEYWORDS.finditer(text))):
+        target = text[match.start() + len(match.group(1)):].strip()
+        try:
+            parse_unit(target)
+        except UnitError:
+            continue
+        return text[:match.start()], target
+    raise UnitError('Expected "<quantity> to <unit>"')
+
+
+@lru_cache(maxsize=256)
+def _parse_quantity(text):
+    parser = _Parser(_tokenize(text))
+    value, unit = parser.quantity()
+    if not parser.done():
+        raise UnitError(f'Invalid quantity: {text}')
+    if unit is None:
+        raise UnitError('The quantity has no unit')
+    return value, unit
+
+
+def evaluate_conversion(text):
+    source, target = _split_conversion(text)
+    value, unit = _parse_quantity(source.strip())
+    target_unit = parse_unit(target)
+    if unit.dims != target_unit.dims:
+        raise UnitError(f'Cannot convert {describe_dimension(unit.dims)} '
+                        f'to {describe_dimension(target_unit.dims)}')
+    return target_unit.from_base(unit.to_base(value)), target